@@ -0,0 +1,136 @@
+import argparse
+import functools
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+from controller import Controller
+from fake_backend import FakePlayer, FakeRecorder
+
+LOG = logging.getLogger('epic_narrator')
+
+# Runs the controller on the simulated backends, without a display, a video or a microphone, with a scripted
+# session of playing, recording and jumping around. Settings and recordings are written to a temporary home folder
+
+parser = argparse.ArgumentParser(
+        description="Headless benchmark of the EPIC Narrator controller",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+)
+parser.add_argument('--duration', type=float, default=30, help='Length of the benchmark in (real) seconds')
+parser.add_argument('--video-length', type=float, default=60, help='Length of the simulated video in minutes')
+parser.add_argument('--time-scale', type=float, default=10,
+                    help='How many milliseconds of video are played in one millisecond')
+parser.add_argument('--position-interval', type=int, default=250,
+                    help='Milliseconds of video between position events')
+parser.add_argument('--seek-latency', type=int, default=50, help='Milliseconds it takes a seek to land')
+parser.add_argument('--recording-interval', type=int, default=500,
+                    help='Start a recording every this many (real) milliseconds')
+parser.add_argument('--recording-length', type=int, default=200, help='Length of the recordings in milliseconds')
+parser.add_argument('--jump-probability', type=float, default=0.2,
+                    help='Probability of jumping to a random position after each recording')
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--verbosity', default='warning', choices=['debug', 'info', 'warning', 'error', 'critical'])
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.work_dir = tempfile.mkdtemp(prefix='epic_narrator_benchmark_')
+        os.environ['HOME'] = self.work_dir  # settings are saved under the home folder
+        self.video_path = os.path.join(self.work_dir, 'video.mp4')
+        open(self.video_path, 'wb').close()
+        self.loop = GLib.MainLoop()
+        self.recordings_made = 0
+        self.jumps = 0
+        self.started = False
+
+        player_class = functools.partial(FakePlayer, video_length_ms=int(args.video_length * 60 * 1000),
+                                         time_scale=args.time_scale, position_interval_ms=args.position_interval,
+                                         seek_latency_ms=args.seek_latency)
+        self.controller = Controller('headless', player_class=player_class, recorder_class=FakeRecorder,
+                                     extract_thumbnails=False)
+        self.controller.signal_sender.connect('ask_output_path', self.output_path_asked)
+        self.controller.signal_sender.connect('video_loaded', self.video_loaded)
+
+    def output_path_asked(self, sender, suggested_folder, changing_output):
+        self.controller.output_path_selected(self.work_dir, changing_output)
+
+    def video_loaded(self, *args):
+        if self.started:
+            return  # the video is reloaded when it reaches the end
+
+        self.started = True
+        self.start_time = time.perf_counter()
+        self.controller.play_video()
+        GLib.timeout_add(self.args.recording_interval, self.start_recording)
+        GLib.timeout_add(int(self.args.duration * 1000), self.finish)
+
+    def start_recording(self):
+        if not self.controller.is_recording():
+            self.controller.start_recording()
+            GLib.timeout_add(self.args.recording_length, self.stop_recording)
+
+        return True
+
+    def stop_recording(self):
+        self.controller.stop_recording()
+        self.recordings_made += 1
+
+        if self.random.random() < self.args.jump_probability:
+            self.jumps += 1
+            self.controller.go_to(self.random.randrange(1, self.controller.video_length), jumped=True)
+
+        self.controller.play_video()
+        return False
+
+    def run(self):
+        self.controller.ui_video_area_ready(None)
+        self.controller.video_selected(self.video_path)
+        self.loop.run()
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start_time
+        player = self.controller.player
+        dispatch_ms = sorted(1000 * t for t in player.position_dispatch_times)
+
+        self.controller.stop_review()
+        self.controller.recorder.close_stream()
+
+        if self.controller.peaks_worker is not None:
+            self.controller.peaks_worker.stop()
+
+        self.controller.prefetcher.stop()
+        player.shutting_down()
+
+        print('Ran for {:.1f}s, video position at the end: {:.1f} minutes'.format(
+            elapsed, player.get_current_position() / 60000))
+        print('Recordings made: {}, jumps: {}, player events: {}'.format(self.recordings_made, self.jumps,
+                                                                          player.events))
+
+        if dispatch_ms:
+            print('Position event handling: mean {:.3f}ms, p95 {:.3f}ms, max {:.3f}ms'.format(
+                sum(dispatch_ms) / len(dispatch_ms), dispatch_ms[int(0.95 * (len(dispatch_ms) - 1))],
+                dispatch_ms[-1]))
+
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.loop.quit()
+        return False
+
+
+def main(args):
+    logging.basicConfig(stream=sys.stderr)
+    LOG.setLevel(getattr(logging, args.verbosity.upper()))
+    Benchmark(args).run()
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
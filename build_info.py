@@ -0,0 +1,50 @@
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMIT_HASH_FILE = 'commit_hash.txt'  # written by flatpak/build_flatpak.sh, missing in other builds
+SHORT_HASH_LENGTH = 7
+
+
+def get_commit_hash():
+    """Short hash of the commit the narrator was built from, or None"""
+    try:
+        with open(os.path.join(SCRIPT_DIR, COMMIT_HASH_FILE)) as f:
+            commit_hash = f.read().strip()
+
+        if commit_hash:
+            return commit_hash
+    except OSError:
+        pass
+
+    try:
+        return read_git_head(os.path.join(SCRIPT_DIR, '.git'))
+    except (OSError, ValueError):
+        return None
+
+
+def read_git_head(git_path):
+    # a worktree or a submodule has a file pointing to the actual git folder
+    if os.path.isfile(git_path):
+        with open(git_path) as f:
+            git_path = os.path.join(os.path.dirname(git_path), f.read().split('gitdir:', 1)[1].strip())
+
+    with open(os.path.join(git_path, 'HEAD')) as f:
+        head = f.read().strip()
+
+    if not head.startswith('ref:'):
+        return head[:SHORT_HASH_LENGTH]  # detached head
+
+    ref = head[len('ref:'):].strip()
+    ref_path = os.path.join(git_path, ref)
+
+    if os.path.exists(ref_path):
+        with open(ref_path) as f:
+            return f.read().strip()[:SHORT_HASH_LENGTH]
+
+    # refs are moved to packed-refs by git gc
+    with open(os.path.join(git_path, 'packed-refs')) as f:
+        for line in f:
+            if line.rstrip().endswith(' ' + ref):
+                return line.split(' ', 1)[0][:SHORT_HASH_LENGTH]
+
+    raise ValueError('Could not find {} in {}'.format(ref, git_path))
@@ -1,18 +1,24 @@
+import bisect
 import logging
 import os
 import traceback
 import gi
-from player import Player
+from playlist import Playlist, VideoPreparer, find_videos
+from prefetch import RecordingPrefetcher
 from recordings import Recordings
 
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, GLib, GObject
-from recorder import Recorder
 from settings import Settings
 
 LOG = logging.getLogger('epic_narrator.controller')
 
 
+def create_vlc_instance():
+    from player import create_vlc_instance  # imports libvlc, in a startup thread
+    return create_vlc_instance()
+
+
 class SignalSender(GObject.Object):
     @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(int, str, str,))
     def video_loaded(self, video_length, video_path, output_path):
@@ -22,6 +28,10 @@ class SignalSender(GObject.Object):
     def ask_video_path(self, video_folder, resetting):
         return True
 
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(str,))
+    def ask_playlist_paths(self, video_folder):
+        return True
+
     @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(str, bool,))
     def ask_output_path(self, suggested_folder, changing_output):
         return True
@@ -48,10 +58,20 @@ class SignalSender(GObject.Object):
     def recording_added(self, rec_time, rec_idx, new):
         pass
 
+    # this is emitted once with all the existing recordings when a video is loaded
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(object,))
+    def recordings_loaded(self, rec_times):
+        pass
+
     @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(int,))
     def recording_deleted(self, rec_time):
         pass
 
+    # this is emitted when the recordings of the loaded video are replaced, e.g. when changing the output folder
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(object,))
+    def narration_density_changed(self, density):
+        pass
+
     @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST)
     def reset_highlighted_rec(self):
         pass
@@ -80,12 +100,37 @@ class SignalSender(GObject.Object):
     def output_path_changed(self, output_path):
         pass
 
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(str,))
+    def review_state_changed(self, state):
+        pass
+
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(str,))
+    def mic_monitor_changed(self, kind):
+        pass
+
 
 class Controller:
-    def __init__(self, this_os):
+    def __init__(self, this_os, player_class=None, recorder_class=None, extract_thumbnails=True, startup_tasks=None):
         LOG.info('Creating controller')
-        self.settings = Settings()
-        self.recorder = self.create_recorder()
+        self.player_class = player_class  # e.g. fake_backend.FakePlayer to run without a display, Player if None
+        self.recorder_class = recorder_class  # e.g. fake_backend.FakeRecorder, Recorder if None
+        self.extract_thumbnails = extract_thumbnails
+        self.startup_tasks = startup_tasks  # a startup.StartupTasks to set up the backends in the background
+        self._settings = None
+        self._recorder = None
+
+        if self.startup_tasks is None:
+            self.settings = Settings()
+            self.recorder = self.create_recorder()
+        else:
+            # joined by the settings and recorder properties when first used
+            self.startup_tasks.submit('settings', Settings)
+            self.startup_tasks.submit('recorder', self.create_recorder)
+            self.startup_tasks.submit('audio_devices', self.query_mic_devices)
+
+            if self.player_class is None:
+                self.startup_tasks.submit('vlc_instance', create_vlc_instance)
+
         self.recordings = None
         self.video_length = 0
         self.is_video_loaded = False
@@ -102,21 +147,55 @@ class Controller:
         self.rec_played_with_video = False
         self.last_played_rec = None
         self.this_os = this_os
+        self.peaks_worker = None  # created with the first recordings, see get_peaks_worker
+        self.review_stream = None
+        self.prefetcher = RecordingPrefetcher(self.prefetch_recording)
+        self.thumbnail_extractor = None
+        self.narration_density = None
+        self.playlist = None
+        self.video_preparer = VideoPreparer(self.prepare_video)
 
         self.signal_sender = SignalSender()
         self.signal_sender.connect('video_moving', self.catch_video_moving)
         LOG.info('Controller created')
 
+    @property
+    def settings(self):
+        if self._settings is None:
+            self._settings = self.startup_tasks.result('settings')
+
+        return self._settings
+
+    @settings.setter
+    def settings(self, settings):
+        self._settings = settings
+
+    @property
+    def recorder(self):
+        if self._recorder is None:
+            self._recorder = self.startup_tasks.result('recorder')
+
+        return self._recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        self._recorder = recorder
+
     def create_recorder(self):
         LOG.info('Creating recorder')
+
+        if self.recorder_class is None:
+            from recorder import Recorder  # imports sounddevice, which initialises portaudio
+            self.recorder_class = Recorder
+
         saved_microphone = self.settings.get_setting('microphone')
 
         if saved_microphone is not None:
             try:
-                recorder = Recorder(device_id=saved_microphone)
+                recorder = self.recorder_class(device_id=saved_microphone)
             except Exception:
-                recorder = Recorder()
-                default_mic_device = Recorder.get_default_device()
+                recorder = self.recorder_class()
+                default_mic_device = self.recorder_class.get_default_device()
 
                 LOG.error('Could not use device with ID {}. This is likely due to a saved configuration '
                           'that is no longer available '
@@ -124,14 +203,20 @@ class Controller:
                           'Using default mic with ID {} now'.format(saved_microphone, default_mic_device))
                 self.settings.update_settings(microphone=default_mic_device)
         else:
-            recorder = Recorder()
+            recorder = self.recorder_class()
 
         recorder.stream.start()
 
         return recorder
 
     def get_mic_devices(self):
-        return Recorder.get_devices()
+        devices = self.startup_tasks.pop('audio_devices') if self.startup_tasks is not None else None
+
+        return devices if devices is not None else self.query_mic_devices()
+
+    def query_mic_devices(self):
+        # portaudio calls must not overlap, so the devices are queried once the microphone stream is open
+        return self.recorder.get_devices()
 
     def get_current_mic_device(self):
         return self.recorder.device_id
@@ -155,8 +240,15 @@ class Controller:
     def shutting_down(self, *args):
         LOG.info('shutting down')
 
+        self.stop_review()
         self.recorder.close_stream()
 
+        if self.peaks_worker is not None:
+            self.peaks_worker.stop()
+
+        self.prefetcher.stop()
+        self.stop_thumbnail_extractor()
+
         if self.is_video_loaded:
             self.settings.update_settings(last_video_position=self.player.get_current_position())
 
@@ -205,6 +297,22 @@ class Controller:
 
         self.signal_sender.emit('ask_video_path', saved_video_folder, resetting)
 
+    def load_playlist_menu_pressed(self, *args):
+        if self.is_recording():
+            return
+
+        LOG.info('Load playlist menu pressed')
+
+        if self.is_video_loaded:
+            self.pause_video()
+
+        saved_video_folder = self.get_setting('video_folder', None)
+
+        if saved_video_folder is None or not os.path.exists(saved_video_folder):
+            saved_video_folder = ''
+
+        self.signal_sender.emit('ask_playlist_paths', saved_video_folder)
+
     def change_output_menu_pressed(self, *args):
         if self.is_recording() or not self.is_video_loaded:
             return
@@ -250,11 +358,29 @@ class Controller:
 
     def ui_video_area_ready(self, widget):
         LOG.info('Video area ready')
-        self.player = Player(widget, self)
+
+        if self.player_class is None:
+            from player import Player  # imports libvlc, which is not needed before the window is shown
+            self.player_class = Player
+
+        vlc_instance = self.startup_tasks.pop('vlc_instance') if self.startup_tasks is not None else None
+
+        if vlc_instance is not None:
+            self.player = self.player_class(widget, self, vlc_instance=vlc_instance)
+        else:
+            self.player = self.player_class(widget, self)
+
+        if self.startup_tasks is not None:
+            self.startup_tasks.finish()
         self.ready_to_load_video()
 
     def ready_to_load_video(self):
         LOG.info('Ready to load video')
+
+        if self.playlist is not None:
+            self.video_selected(self.playlist.get_current())
+            return
+
         last_video_path = self.get_setting('last_video', None)
 
         if last_video_path is not None and os.path.exists(last_video_path):
@@ -283,17 +409,36 @@ class Controller:
             del self.recordings
             self.signal_sender.emit('resetting_recordings')
 
-        self.recordings = Recordings(self.output_path, self.video_path)
+        # the next video of a playlist has its recordings loaded in the background
+        self.recordings = self.video_preparer.take(self.video_path, self.output_path)
+
+        if self.recordings is None:
+            self.recordings = Recordings(self.output_path, self.video_path)
+
+            if self.recordings.narrations_exist():
+                self.recordings.load_narrations()
 
-        if self.recordings.narrations_exist():
-            self.recordings.load_narrations()
+        if not self.recordings.empty():
+            self.signal_sender.emit('recordings_loaded', list(self.recordings.get_recordings_times()))
 
-            for rec_idx, rec_ms in enumerate(self.recordings.get_recordings_times()):
-                self.signal_sender.emit('recording_added', rec_ms, rec_idx, False)
+            # build the peaks of recordings made before the peak cache existed
+            self.get_peaks_worker().submit_missing(self.recordings.get_recordings_paths())
+
+        # when the output folder changes the video stays loaded, so the density must follow the new recordings
+        if self.is_video_loaded:
+            self.build_narration_density()
+            self.signal_sender.emit('narration_density_changed', self.narration_density)
+
+    def build_narration_density(self):
+        from density import NarrationDensity  # imports numpy, not needed before the window is shown
+        self.narration_density = NarrationDensity(self.video_length, times_ms=self.recordings.get_recordings_times())
 
     def reset(self):
         LOG.info('Resetting')
 
+        self.stop_review()
+        self.stop_thumbnail_extractor()
+        self.narration_density = None
         self.is_video_loaded = False
         self.loaded_last_video = False
         self.holding_enter = False
@@ -311,8 +456,13 @@ class Controller:
 
         self.is_video_loaded = True
         self.video_length = self.player.get_video_length()
+        self.start_thumbnail_extractor()
+        self.build_narration_density()
         self.signal_sender.emit('video_loaded', self.video_length, self.video_path, self.output_path)
 
+        if self.playlist is not None and self.playlist.has_next():
+            self.video_preparer.prepare(self.playlist.get_next(), self.output_path)
+
         if self.loaded_last_video:
             last_position = self.get_setting('last_video_position', 1)
             self.go_to(last_position, jumped=True)
@@ -350,6 +500,22 @@ class Controller:
     def play_recordings_with_video_toggled(self, widget):
         self.settings.update_settings(play_recs_with_video=widget.get_active())
 
+    def low_latency_rec_playback_toggled(self, widget):
+        enabled = widget.get_active()
+
+        if self.player is not None and not self.player.set_low_latency_recording_playback(enabled):
+            widget.set_active(False)
+            return
+
+        self.settings.update_settings(low_latency_rec_playback=enabled)
+
+    def use_seek_proxy_toggled(self, widget):
+        enabled = widget.get_active()
+        self.settings.update_settings(use_seek_proxy=enabled)
+
+        if self.player is not None:
+            self.player.set_seek_proxy_enabled(enabled)
+
     def play_video(self, *args):
         if not self.is_video_loaded or self.recorder.is_recording:
             return
@@ -440,6 +606,7 @@ class Controller:
             return
 
         self.recordings.reset_highlighted()
+        self.prefetcher.cancel()
         self.player.go_to(int(time_ms))
 
         if jumped:
@@ -449,6 +616,33 @@ class Controller:
             # the controller is connected to this signal, so it will highlight and scroll to the narration
             self.signal_sender.emit('video_moving', self.player.get_current_position(), self.player.is_seeking())
 
+    def jump_to_next_gap(self):
+        if not self.is_video_loaded or self.recorder.is_recording:
+            return
+
+        min_gap_ms = self.get_setting('min_gap_seconds', 10) * 1000
+        gap_ms = self.narration_density.find_next_gap(self.player.get_current_position(), min_gap_ms)
+
+        if gap_ms is None:
+            LOG.info('No gaps of at least {}ms after the current position'.format(min_gap_ms))
+            return
+
+        LOG.info('Jumping to the gap at {}ms'.format(gap_ms))
+        self.reset_highlighted_rec()
+        self.go_to(gap_ms, jumped=True)
+
+    def min_gap_selected(self, widget, min_gap_seconds):
+        if widget.get_active():
+            self.settings.update_settings(min_gap_seconds=min_gap_seconds)
+
+    def mic_monitor_selected(self, widget, kind):
+        if widget.get_active():
+            self.settings.update_settings(mic_monitor=kind)
+            self.signal_sender.emit('mic_monitor_changed', kind)
+
+    def get_narration_density(self):
+        return self.narration_density
+
     def start_dragging(self):
         if not self.is_video_loaded or self.recorder.is_recording:
             return
@@ -464,12 +658,15 @@ class Controller:
         else:
             self.was_playing_before_dragging = False
 
+        self.player.start_scrubbing()
+
     def stop_dragging(self, time_ms):
         if not self.is_video_loaded or self.recorder.is_recording:
             return
 
         LOG.info('Stop dragging')
 
+        self.player.stop_scrubbing(time_ms, resume=self.was_playing_before_dragging)
         self.go_to(time_ms, jumped=True)
         self.is_dragging = False
 
@@ -484,8 +681,15 @@ class Controller:
 
         self.highlight_recording(sender, time_ms, is_seeking)
 
-        if self.get_setting('play_recs_with_video', False) \
-                and self.highlighted_rec is not None \
+        if not self.get_setting('play_recs_with_video', False):
+            return
+
+        if is_seeking or self.is_dragging:
+            self.prefetcher.cancel()
+        else:
+            self.prefetcher.update(self.recordings, time_ms, self.get_setting('playback_speed', 1))
+
+        if self.highlighted_rec is not None \
                 and not is_seeking \
                 and not self.is_dragging \
                 and self.last_played_rec != self.highlighted_rec:
@@ -543,6 +747,8 @@ class Controller:
             self.invoke_stop_recording()
 
     def start_recording(self, overwrite=False, rec_time=None):
+        self.stop_review()
+
         # first start the recording and then update the ui to prevent clipping
         if self.player.is_playing():
             self.pause_video()
@@ -573,8 +779,12 @@ class Controller:
         if overwrite:
             self.signal_sender.emit('set_highlighted_rec', rec_time, True)
         else:
+            self.narration_density.add(rec_time)
             self.signal_sender.emit('recording_added', rec_time, rec_idx, True)
 
+            if self.thumbnail_extractor is not None:
+                self.thumbnail_extractor.submit(rec_time)
+
         self.signal_sender.emit('recording_state_changed', 'recording')
         LOG.info('Start recording')
 
@@ -584,6 +794,8 @@ class Controller:
 
     def stop_recording(self):
         self.recorder.stop_recording()
+        self.get_peaks_worker().submit(self.recorder.current_path, force=True)
+        self.recordings.forget_size(self.highlighted_rec)
 
         LOG.info("Recording stopped")
         self.signal_sender.emit('recording_state_changed', 'not_recording')
@@ -629,11 +841,94 @@ class Controller:
             self.stop_recording()
 
         self.recordings.delete_recording(time_ms)
+        self.narration_density.remove(time_ms)
+
+        if self.thumbnail_extractor is not None:
+            self.thumbnail_extractor.remove(time_ms)
+
         self.signal_sender.emit('recording_deleted', time_ms)
 
         if self.get_setting('play_after_delete', False):
             self.play_video()
 
+    def set_playlist(self, paths):
+        videos = find_videos(paths)
+
+        if not videos:
+            LOG.error('No videos found in {}'.format(paths))
+            return False
+
+        LOG.info('Playlist of {} videos: {}'.format(len(videos), videos))
+        self.playlist = Playlist(videos)
+
+        return True
+
+    def playlist_selected(self, paths):
+        if not self.set_playlist(paths):
+            return
+
+        if self.player is not None:
+            self.video_selected(self.playlist.get_current())
+
+    def next_video(self, *args):
+        if self.playlist is None or not self.playlist.has_next() or self.is_recording():
+            return
+
+        if self.is_video_loaded:
+            self.pause_video()
+
+        video_path = self.playlist.advance()
+        LOG.info('Moving to the next video in the playlist ({}/{}): {}'.format(self.playlist.index + 1,
+                                                                            len(self.playlist), video_path))
+        self.video_selected(video_path)
+
+    def prepare_video(self, video_path):
+        # this is called from the video preparer thread
+        if self.player is not None:
+            self.player.prepare_video(video_path)
+
+    def start_thumbnail_extractor(self):
+        extractor = self.thumbnail_extractor
+
+        # video_loaded also runs when the video is reloaded at the end, the extractor (and its vlc) can be kept
+        if extractor is not None and extractor.video_path == self.video_path and \
+                extractor.narrations_folder == self.recordings.video_narrations_folder:
+            extractor.submit_missing(self.recordings.get_recordings_times())
+            return
+
+        self.stop_thumbnail_extractor()
+
+        if not self.extract_thumbnails:
+            return
+
+        from thumbnails import ThumbnailExtractor, get_thumbnail_size  # imports numpy and libvlc
+
+        size = get_thumbnail_size(self.player.video_metadata)
+        self.thumbnail_extractor = ThumbnailExtractor(self.recordings.video_narrations_folder, self.video_path, size)
+        self.thumbnail_extractor.submit_missing(self.recordings.get_recordings_times())
+
+    def stop_thumbnail_extractor(self):
+        if self.thumbnail_extractor is not None:
+            self.thumbnail_extractor.stop()
+            self.thumbnail_extractor = None
+
+    def get_thumbnail(self, time_ms):
+        if self.thumbnail_extractor is None:
+            return None
+
+        return self.thumbnail_extractor.get_thumbnail(time_ms)
+
+    def prefetch_recording(self, recording_path):
+        # this is called from the prefetcher thread
+        if self.player is not None:
+            return self.player.prefetch_recording(recording_path)
+
+        return None
+
+    def load_recording_now(self, recording_path, callback):
+        # the prefetcher thread decodes recordings that are about to be played, so the main thread never does
+        self.prefetcher.load_now(recording_path, callback)
+
     def recording_finished_playing(self):
         if not self.is_video_loaded:
             return
@@ -642,9 +937,79 @@ class Controller:
             self.play_video()
             self.rec_played_with_video = False
 
+    def toggle_review(self, *args):
+        if self.review_stream is not None:
+            self.stop_review()
+        else:
+            self.start_review()
+
+    def start_review(self):
+        if not self.is_video_loaded or self.is_recording() or self.recordings.empty():
+            self.signal_sender.emit('review_state_changed', 'stopped')
+            return
+
+        LOG.info('Starting review')
+        self.pause_video()
+
+        # review from the current position, or from the beginning if there is nothing after it
+        times = self.recordings.get_recordings_times()
+        first = bisect.bisect_left(times, self.player.get_current_position())
+        times = times[first:] if first < len(times) else times
+        recordings = [(t, self.recordings.get_path_for_recording(t)) for t in times]
+
+        from review import ReviewStream  # imports sounddevice, not needed until the first review
+
+        self.review_stream = ReviewStream(recordings, self.reviewed_recording_started, self.review_finished)
+
+        try:
+            self.review_stream.start()
+        except Exception:
+            LOG.error(traceback.format_exc())
+            self.review_stream = None
+            self.signal_sender.emit('review_state_changed', 'stopped')
+            return
+
+        self.signal_sender.emit('review_state_changed', 'reviewing')
+
+    def stop_review(self):
+        if self.review_stream is None:
+            return
+
+        self.review_stream.stop()
+        self.review_stream = None
+        self.signal_sender.emit('review_state_changed', 'stopped')
+
+    def reviewed_recording_started(self, time_ms):
+        if self.review_stream is None or not self.recordings.recording_exists(time_ms):
+            return
+
+        self.go_to(time_ms, jumped=True)
+        self.highlighted_rec = time_ms
+        self.signal_sender.emit('set_highlighted_rec', time_ms, False)
+
+    def review_finished(self):
+        LOG.info('Review finished')
+        self.stop_review()
+
     def get_recording_times(self):
         return self.recordings.get_recordings_times()
 
+    def get_recording_peaks(self, time_ms):
+        recording_path = self.recordings.get_path_for_recording(time_ms)
+
+        if recording_path is None:
+            return None
+
+        from peaks import PeakPyramid  # imports numpy and soundfile
+        return PeakPyramid.for_recording(recording_path)
+
+    def get_peaks_worker(self):
+        if self.peaks_worker is None:
+            from peaks import PeaksWorker  # imports numpy and soundfile, not needed before the window is shown
+            self.peaks_worker = PeaksWorker()
+
+        return self.peaks_worker
+
     def main_window_key_pressed(self, widget, event):
         if not self.is_video_loaded:
             return True
@@ -696,6 +1061,12 @@ class Controller:
             self.signal_sender.emit('ask_confirmation_for_overwriting_rec', self.highlighted_rec)
         elif event.keyval == Gdk.KEY_M or event.keyval == Gdk.KEY_m:
             self.toggle_audio()
+        elif event.keyval == Gdk.KEY_R or event.keyval == Gdk.KEY_r:
+            self.toggle_review()
+        elif event.keyval == Gdk.KEY_N or event.keyval == Gdk.KEY_n:
+            self.next_video()
+        elif event.keyval == Gdk.KEY_G or event.keyval == Gdk.KEY_g:
+            self.jump_to_next_gap()
         elif event.keyval == Gdk.KEY_Delete or event.keyval == Gdk.KEY_BackSpace:
             if self.recordings.empty() or self.highlighted_rec is None:
                 return True
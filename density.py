@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+
+
+class NarrationDensity:
+    """Narration counts per bin, kept in a segment tree to draw the density and find gaps"""
+
+    def __init__(self, length_ms, bin_ms=1000, times_ms=()):
+        self.length_ms = length_ms
+        self.bin_ms = bin_ms
+        self.n_bins = max(1, math.ceil(length_ms / bin_ms))
+        self.size = 1 << (self.n_bins - 1).bit_length()
+        self.count = [0] * (2 * self.size)
+        self.prefix = [0] * (2 * self.size)  # empty bins at the start of the node
+        self.suffix = [0] * (2 * self.size)  # empty bins at the end of the node
+        self.best = [0] * (2 * self.size)  # longest run of empty bins in the node
+        self.width = [0] * (2 * self.size)  # bins covered by the node
+
+        for time_ms in times_ms:
+            self.count[self.size + self._get_bin(time_ms)] += 1
+
+        # padding bins past the end of the video are not gaps
+        for leaf in range(self.size, 2 * self.size):
+            empty = 1 if leaf - self.size < self.n_bins and self.count[leaf] == 0 else 0
+            self.prefix[leaf] = self.suffix[leaf] = self.best[leaf] = empty
+            self.width[leaf] = 1
+
+        for node in range(self.size - 1, 0, -1):
+            self._pull(node)
+
+    def _get_bin(self, time_ms):
+        return min(self.n_bins - 1, max(0, int(time_ms // self.bin_ms)))
+
+    def _pull(self, node):
+        left, right = 2 * node, 2 * node + 1
+        self.count[node] = self.count[left] + self.count[right]
+        self.width[node] = self.width[left] + self.width[right]
+        self.prefix[node] = self.prefix[left] if self.prefix[left] < self.width[left] \
+            else self.width[left] + self.prefix[right]
+        self.suffix[node] = self.suffix[right] if self.suffix[right] < self.width[right] \
+            else self.width[right] + self.suffix[left]
+        self.best[node] = max(self.best[left], self.best[right], self.suffix[left] + self.prefix[right])
+
+    def _update(self, time_ms, delta):
+        leaf = self.size + self._get_bin(time_ms)
+        self.count[leaf] = max(0, self.count[leaf] + delta)
+        empty = 1 if self.count[leaf] == 0 else 0
+        self.prefix[leaf] = self.suffix[leaf] = self.best[leaf] = empty
+        node = leaf // 2
+
+        while node >= 1:
+            self._pull(node)
+            node //= 2
+
+    def add(self, time_ms):
+        self._update(time_ms, 1)
+
+    def remove(self, time_ms):
+        self._update(time_ms, -1)
+
+    def get_total(self):
+        return self.count[1]
+
+    def get_counts(self, start_ms, end_ms, n_columns):
+        """Number of narrations in each of n_columns equal parts of [start_ms, end_ms)"""
+        ms_per_column = (end_ms - start_ms) / n_columns
+        level = 0
+
+        while (self.bin_ms << (level + 1)) <= ms_per_column and (self.size >> (level + 1)) >= 1:
+            level += 1
+
+        node_bins = 1 << level
+        first_bin = self._get_bin(start_ms)
+        last_bin = self._get_bin(max(start_ms, end_ms - 1))
+        level_start = self.size >> level
+        first, last = first_bin // node_bins, last_bin // node_bins + 1
+        counts = np.array(self.count[level_start + first:level_start + last], dtype=np.float64)
+        node_centre_ms = (np.arange(first, last) * node_bins + node_bins / 2) * self.bin_ms
+        columns = np.clip(((node_centre_ms - start_ms) / ms_per_column).astype(np.int64), 0, n_columns - 1)
+
+        return np.bincount(columns, weights=counts, minlength=n_columns)[:n_columns]
+
+    def _find_gap(self, node, lo, hi, first_bin, min_bins, run):
+        # returns (start bin of the gap or None, empty bins right before the next node)
+        if hi <= first_bin:
+            return None, 0
+
+        if lo >= first_bin:
+            if run + self.prefix[node] >= min_bins:
+                return lo - run, 0
+
+            if self.best[node] < min_bins:
+                return None, run + self.width[node] if self.prefix[node] == self.width[node] else self.suffix[node]
+
+        mid = (lo + hi) // 2
+        found, run = self._find_gap(2 * node, lo, mid, first_bin, min_bins, run)
+
+        if found is not None:
+            return found, 0
+
+        return self._find_gap(2 * node + 1, mid, hi, first_bin, min_bins, run)
+
+    def _find_occupied(self, node, lo, hi, first_bin):
+        if hi <= first_bin or self.count[node] == 0:
+            return None
+
+        if hi - lo == 1:
+            return lo
+
+        mid = (lo + hi) // 2
+        found = self._find_occupied(2 * node, lo, mid, first_bin)
+
+        return found if found is not None else self._find_occupied(2 * node + 1, mid, hi, first_bin)
+
+    def find_next_gap(self, time_ms, min_gap_ms):
+        """Start of the first gap of at least min_gap_ms after time_ms, or None"""
+        min_bins = max(1, math.ceil(min_gap_ms / self.bin_ms))
+        first_bin = self._get_bin(time_ms)
+
+        if self.count[self.size + first_bin] == 0:
+            first_bin = self._find_occupied(1, 0, self.size, first_bin)
+
+            if first_bin is None:
+                return None  # no narrations after time_ms, we are in the last gap already
+
+        gap_bin, _ = self._find_gap(1, 0, self.size, first_bin + 1, min_bins, 0)
+
+        return None if gap_bin is None else gap_bin * self.bin_ms
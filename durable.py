@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+
+LOG = logging.getLogger('epic_narrator.durable')
+
+
+def get_temporary_path(path):
+    # hidden and with a different extension, so partial files are never picked up as recordings
+    folder, filename = os.path.split(path)
+    return os.path.join(folder, '.{}.part'.format(filename))
+
+
+def is_temporary_path(path):
+    filename = os.path.basename(path)
+    return filename.startswith('.') and filename.endswith('.part')
+
+
+def get_final_path(temporary_path):
+    folder, filename = os.path.split(temporary_path)
+    return os.path.join(folder, filename[1:-len('.part')])
+
+
+def fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(folder):
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return  # directories cannot be opened on Windows, where renames are already durable
+
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        LOG.error('Could not fsync directory {}: {}'.format(folder, e))
+    finally:
+        os.close(fd)
+
+
+def commit_file(temporary_path, path):
+    """Makes the content of temporary_path durable and atomically moves it to path"""
+    fsync_file(temporary_path)
+    os.replace(temporary_path, path)
+
+
+class DirectoryFlusher:
+    """Fsyncs files and directories in a background thread"""
+
+    def __init__(self, interval_s=1.0):
+        self.interval_s = interval_s
+        self._pending = set()
+        self._pending_files = []
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='directory_flusher', daemon=True)
+        self._thread.start()
+
+    def schedule(self, folder, file_path=None):
+        with self._condition:
+            if file_path is not None:
+                self._pending_files.append(file_path)
+
+            self._pending.add(folder)
+            self._condition.notify()
+
+    def flush_files(self):
+        with self._condition:
+            pending_files, self._pending_files = self._pending_files, []
+
+        for path in pending_files:
+            try:
+                fsync_file(path)
+            except OSError as e:
+                LOG.error('Could not fsync {}: {}'.format(path, e))
+
+    def flush(self):
+        self.flush_files()
+
+        with self._condition:
+            pending, self._pending = self._pending, set()
+
+        for folder in pending:
+            fsync_directory(folder)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    break
+
+            self.flush_files()
+            # give other renames the chance to join this batch
+            time.sleep(self.interval_s)
+            self.flush()
+
+        self.flush()
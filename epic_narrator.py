@@ -1,3 +1,7 @@
+import time
+
+STARTED = time.perf_counter()  # before anything else is imported, for the time to window
+
 import argparse
 import faulthandler
 import logging
@@ -5,16 +9,11 @@ import os
 import sys
 from logging.handlers import RotatingFileHandler
 
-from controller import Controller
-from recorder import Recorder
+from build_info import get_commit_hash
 from settings import Settings
-from ui import MainWindow, HelpWindow
+from startup import StartupTasks
+from startup_profile import ImportProfiler, log_time_to_window
 
-import gi
-gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk
-
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG = logging.getLogger('epic_narrator')
 
 parser = argparse.ArgumentParser(
@@ -34,12 +33,44 @@ parser.add_argument(
         help='Set audio device to be used for recording, given the device id. '
              'Use `--query_audio_devices` to get the devices available in your system '
              'with their corresponding ids')
+parser.add_argument(
+        '--build-peaks',
+        '--build_peaks',
+        type=str, metavar='PATH',
+        help='Build the waveform peaks of all the recordings found under PATH (e.g. an epic_narrator_recordings '
+             'folder) and exit')
+parser.add_argument(
+        '--scan-recordings',
+        '--scan_recordings',
+        type=str, metavar='PATH',
+        help='Flag empty, silent and duplicate recordings found under PATH, print a report and exit')
+parser.add_argument('--scan-report', type=str, metavar='CSV',
+                    help='Write the report of --scan-recordings to this file instead of the standard output')
+parser.add_argument('--quarantine', action='store_true',
+                    help='Move the recordings flagged by --scan-recordings to a epic_narrator_quarantine folder '
+                         'next to PATH')
+parser.add_argument(
+        '--check-wavs',
+        '--check_wavs',
+        type=str, metavar='PATH',
+        help='Check that the headers of all the recordings found under PATH match their file sizes, print the '
+             'broken ones and exit')
+parser.add_argument('--repair-wavs', action='store_true',
+                    help='Fix in place the headers of the truncated recordings found by --check-wavs')
+parser.add_argument(
+        '--playlist',
+        type=str, nargs='+', metavar='PATH',
+        help='Annotate these videos (or the videos in these folders) one after the other. '
+             'The next video is prepared in the background while you annotate the current one')
 parser.add_argument('--verbosity',
                     default='info',
                     choices=['debug', 'info', 'warning', 'error', 'critical'],
                     help="Logging verbosity, one of 'debug', 'info', 'warning', "
                          "'error', 'critical'.")
 parser.add_argument('--log-file', type=str, help='Path to log file.')
+parser.add_argument('--profile-imports', action='store_true',
+                    help='Time the modules imported before the window is shown and print a report like the one of '
+                         '`python -X importtime`. The report and the time to window are also logged')
 
 
 def get_os():
@@ -54,39 +85,79 @@ def get_os():
 
 
 def main(args):
+    profiler = None
+
+    if args.profile_imports:
+        profiler = ImportProfiler()
+        profiler.install()
+
     setup_logging(args)
-    commit_hash = get_git_commit_hash()
-    LOG.info("Starting the EPIC-narrator" +
-             (" ({})".format(commit_hash) if commit_hash is not None else ""))
+    startup_tasks = StartupTasks(STARTED)
+    startup_tasks.submit('commit_hash', log_start)
 
+    # the modules needed by the window (gtk, sounddevice, libvlc...) are only imported once we know we need them
     if args.query_audio_devices:
+        from recorder import Recorder
         print(Recorder.get_devices())
         exit()
 
+    if args.build_peaks is not None:
+        from peaks import build_peaks_for_folder
+        print('Built peaks for {} recordings'.format(build_peaks_for_folder(args.build_peaks)))
+        exit()
+
+    if args.scan_recordings is not None:
+        from narration_scanner import NarrationScanner, write_report
+        scanner = NarrationScanner(args.scan_recordings)
+        report = scanner.scan()
+
+        if args.quarantine:
+            scanner.quarantine(report)
+
+        write_report(report, args.scan_report)
+        exit()
+
+    if args.check_wavs is not None:
+        from wav_repair import WavChecker
+        results = WavChecker(args.check_wavs).check(repair=args.repair_wavs)
+
+        for path, result in sorted(results.items()):
+            print('{}\t{}\t{}'.format(result['status'], path, result.get('reason', '')))
+
+        exit()
+
     if args.set_audio_device >= 0:
+        from recorder import Recorder
         LOG.info('Changing default mic device to {}'.format(args.set_audio_device))
         Recorder.set_default_device(args.set_audio_device)
 
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk
+    from controller import Controller
+
     this_os = get_os()
     single_window = this_os in ['linux', 'windows']
 
-    controller = Controller(this_os)
+    # the settings, the microphone and vlc are set up in the background while the window is built
+    controller = Controller(this_os, startup_tasks=startup_tasks)
+
+    from ui import MainWindow
+
+    if args.playlist is not None and not controller.set_playlist(args.playlist):
+        exit(1)
+
     main_window = MainWindow(controller, this_os, single_window=single_window)
+    log_time_to_window(main_window, STARTED, profiler, startup_tasks)
     main_window.show()
 
     Gtk.main()
 
 
-def get_git_commit_hash():
-    import subprocess
-
-    try:
-        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
-                                check=True,
-                                stdout=subprocess.PIPE)
-        return output.stdout.decode('utf-8').strip()
-    except Exception:
-        return None
+def log_start():
+    commit_hash = get_commit_hash()
+    LOG.info("Starting the EPIC-narrator" +
+             (" ({})".format(commit_hash) if commit_hash is not None else ""))
 
 
 def setup_logging(args):
@@ -0,0 +1,321 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+from durable import commit_file, get_temporary_path
+
+LOG = logging.getLogger('epic_narrator.fake_backend')
+
+# Simulated backends with the same interface as Player and Recorder, so the controller can run without a display,
+# a real video or a microphone (e.g. for benchmarks on a headless machine). See benchmark.py
+
+
+class FakePlayer:
+    """Simulated video player whose virtual time runs time_scale times faster than real time"""
+
+    def __init__(self, widget, controller, video_length_ms=60 * 60 * 1000, time_scale=1, tick_ms=10,
+                 position_interval_ms=250, seek_latency_ms=50, load_latency_ms=100):
+        LOG.info('Creating fake player')
+        self.controller = controller
+        self.video_length_ms = video_length_ms
+        self.time_scale = time_scale
+        self.tick_ms = tick_ms
+        self.position_interval_ms = position_interval_ms
+        self.seek_latency_ms = seek_latency_ms
+        self.load_latency_ms = load_latency_ms
+        self.video_length = 0
+        self.video_path = None
+        self.video_metadata = None
+        self.was_playing_before_seek = None
+        self.seek_refresh = 50  # milliseconds
+        self.seek_step = 500  # milliseconds
+        self.events = {'position': 0, 'seeks': 0, 'ended': 0, 'recordings_played': 0}
+        self.position_dispatch_times = []  # seconds spent in the handlers of each position event
+        self._position = 0
+        self._rate = 1
+        self._playing = False
+        self._muted = True
+        self._last_event_position = 0
+        self._seek_target = None
+        self._seek_timeout = 0
+        self._seeking_timeout = 0
+        self._is_seeking = False
+        self._last_tick = time.monotonic()
+        self._tick_id = GLib.timeout_add(self.tick_ms, self._tick)
+
+    def shutting_down(self):
+        LOG.info('Shutting down fake player (events={})'.format(self.events))
+        GLib.source_remove(self._tick_id)
+        self._cancel_seek()
+
+    def load_video(self, video_path):
+        LOG.info('Loading fake video {}'.format(video_path))
+        self.video_path = video_path
+        self._position = 0
+        self._playing = False
+        GLib.timeout_add(self.load_latency_ms, self.video_loaded)
+
+    def prepare_video(self, video_path):
+        return None
+
+    def video_loaded(self):
+        self.video_length = self.video_length_ms
+        self.controller.video_loaded()
+        return False
+
+    def get_video_length(self):
+        return self.video_length
+
+    def play_video(self):
+        self._playing = True
+
+    def pause_video(self):
+        self._playing = False
+
+    def set_speed(self, speed):
+        self._rate = speed
+
+    def mute_video(self):
+        self._muted = True
+
+    def unmute_video(self):
+        self._muted = False
+
+    def get_current_position(self):
+        return self._seek_target if self._seek_target is not None else int(self._position)
+
+    def is_playing(self):
+        return self._playing
+
+    def is_mute(self):
+        return self._muted
+
+    def is_seeking(self):
+        return self._is_seeking or self._seeking_timeout != 0
+
+    def get_state(self):
+        return {'playing': self._playing, 'muted': self._muted, 'rate': self._rate,
+                'time_ms': self.get_current_position(), 'length_ms': self.video_length}
+
+    def _tick(self):
+        now = time.monotonic()
+        elapsed_ms = 1000 * (now - self._last_tick)
+        self._last_tick = now
+
+        if not self._playing or self._seek_target is not None:
+            return True
+
+        self._position = min(self.video_length, self._position + elapsed_ms * self.time_scale * self._rate)
+
+        if self._position >= self.video_length > 0:
+            self.events['ended'] += 1
+            self._playing = False
+            self.controller.reload_current_video()
+        elif self._position - self._last_event_position >= self.position_interval_ms:
+            self._dispatch_position()
+
+        return True
+
+    def _dispatch_position(self):
+        self._last_event_position = self._position
+        self.events['position'] += 1
+        start = time.perf_counter()
+        self.controller.signal_sender.emit('video_moving', self.get_current_position(), self.is_seeking())
+        self.position_dispatch_times.append(time.perf_counter() - start)
+
+    def go_to(self, time_ms):
+        self._cancel_seek()
+        self.events['seeks'] += 1
+        self._seek_target = int(time_ms)
+        self._seek_timeout = GLib.timeout_add(self.seek_latency_ms, self._seek_landed)
+
+    def _seek_landed(self):
+        self._position = self._seek_target
+        self._seek_target = None
+        self._seek_timeout = 0
+        self._dispatch_position()
+        return False
+
+    def _cancel_seek(self):
+        if self._seek_timeout:
+            GLib.source_remove(self._seek_timeout)
+
+        self._seek_timeout = 0
+
+        if self._seek_target is not None:
+            self._position = self._seek_target
+            self._seek_target = None
+
+    def start_seek(self, direction):
+        self.was_playing_before_seek = self._playing
+        self._playing = False
+        step = self.seek_step if direction == 'forward' else - self.seek_step
+        self._seeking_timeout = GLib.timeout_add(self.seek_refresh, self.seek, step)
+
+    def stop_seek(self):
+        GLib.source_remove(self._seeking_timeout)
+        self._seeking_timeout = 0
+        self._is_seeking = False
+
+        if self.was_playing_before_seek:
+            self.play_video()
+
+    def seek(self, step):
+        seek_pos = self.get_current_position() + step
+
+        if 0 < seek_pos < self.video_length:
+            self._is_seeking = True
+            self.go_to(seek_pos)
+
+        return True
+
+    def start_scrubbing(self):
+        pass
+
+    def stop_scrubbing(self, time_ms=None, resume=False):
+        return False
+
+    def set_seek_proxy_enabled(self, enabled):
+        pass
+
+    def set_low_latency_recording_playback(self, enabled):
+        return True
+
+    def prefetch_recording(self, recording_path):
+        pass
+
+    def play_recording(self, recording_path):
+        self.events['recordings_played'] += 1
+
+        try:
+            duration_ms = int(1000 * sf.info(recording_path).duration)
+        except RuntimeError:
+            duration_ms = 0
+
+        GLib.timeout_add(max(1, int(duration_ms / self.time_scale)), self.finished_playing_recording)
+
+    def finished_playing_recording(self):
+        self.controller.recording_finished_playing()
+        return False
+
+    def reset(self):
+        LOG.info('Resetting fake player')
+        self._cancel_seek()
+
+        if self._seeking_timeout:
+            GLib.source_remove(self._seeking_timeout)
+
+        self.video_length = 0
+        self.video_metadata = None
+        self.was_playing_before_seek = None
+        self._seeking_timeout = 0
+        self._is_seeking = False
+        self._position = 0
+        self._last_event_position = 0
+        self._playing = False
+
+
+class FakeStream:
+    def __init__(self, feed_function):
+        self.feed_function = feed_function
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        # a new event for every start, so a thread that has not noticed the close yet does not keep running
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, args=(self._running,), name='fake_microphone', daemon=True)
+        self._thread.start()
+
+    def close(self, ignore_errors=True):
+        self._running.clear()
+        self._thread = None
+
+    def _run(self, running):
+        while running.is_set():
+            self.feed_function()
+
+
+class FakeRecorder:
+    """Simulated microphone with the same interface as Recorder"""
+
+    def __init__(self, channels=[1], device_id=0, window=200, downsample=10, sample_rate=16000, block_size=1024,
+                 max_queued_blocks=100):
+        LOG.info('Creating fake recorder')
+        self.mapping = [c - 1 for c in channels]
+        self.q = queue.Queue(maxsize=max_queued_blocks)  # nobody may be reading it when running headless
+        self.channels = channels
+        self.device_id = device_id
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.downsample = downsample
+        self.window = window
+        self.length = int(self.window * self.sample_rate / (1000 * self.downsample))
+        self.is_recording = False
+        self.current_path = None
+        self._started_at = None
+        self._rng = np.random.default_rng(0)
+        self.stream = FakeStream(self._feed)
+
+    def change_device(self, device_id):
+        self.close_stream()
+        self.device_id = device_id
+        self.stream = FakeStream(self._feed)
+
+    def close_stream(self):
+        if self.is_recording:
+            self.stop_recording()
+
+        self.stream.close(ignore_errors=True)
+
+    def _feed(self):
+        time.sleep(self.block_size / self.sample_rate)
+        block = 0.1 * self._rng.standard_normal((self.block_size, len(self.channels)), dtype=np.float32)
+
+        try:
+            self.q.put_nowait(block[::self.downsample, self.mapping])
+        except queue.Full:
+            pass
+
+    def start_recording(self, filename):
+        LOG.info('Starting fake recording, saving to {}'.format(filename))
+        self.current_path = filename
+        self.is_recording = True
+        self._started_at = time.monotonic()
+
+    def stop_recording(self):
+        LOG.info('Stopping fake recording, saved to {}'.format(self.current_path))
+        self.is_recording = False
+        n_samples = int((time.monotonic() - self._started_at) * self.sample_rate)
+        tone = 0.3 * np.sin(2 * np.pi * 440 * np.arange(n_samples) / self.sample_rate).astype(np.float32)
+        tmp_path = get_temporary_path(self.current_path)
+        audio_format = os.path.splitext(self.current_path)[1][1:]
+        sf.write(tmp_path, tone, self.sample_rate, format=audio_format)
+        commit_file(tmp_path, self.current_path)
+
+    def get_window_size(self):
+        return self.length, len(self.channels)
+
+    @staticmethod
+    def get_devices():
+        return [{'dev_idx': 0, 'dev_name': 'Fake microphone'}]
+
+    @staticmethod
+    def set_default_device(dev_id):
+        pass
+
+    @staticmethod
+    def get_default_device():
+        return 0
@@ -1,3 +1,5 @@
 #!/bin/sh
+# the narrator reads the commit it was built from from this file, instead of running git at every start
+git rev-parse --short HEAD > commit_hash/commit_hash.txt
 flatpak-builder --repo=repo --force-clean build-dir epic.narrator.json
 flatpak build-bundle repo epic_narrator.flatpak uk.ac.bris.epic.narrator
@@ -0,0 +1,86 @@
+import logging
+import time
+from collections import deque
+
+LOG = logging.getLogger('epic_narrator.frame_scheduler')
+
+_NOT_DRAWN = object()
+
+
+class FrameScheduler:
+    """Runs widget updates at most once per frame, and only when what they show changes"""
+
+    def __init__(self, widget, name, frame_window=1000):
+        self.widget = widget
+        self.name = name
+        self.frame_times = deque(maxlen=frame_window)  # seconds of work in each frame
+        self.stats = {'frames': 0, 'requested': 0, 'coalesced': 0, 'unchanged': 0, 'run': 0}
+        self._updates = {}
+        self._dirty = {}
+        self._drawn = {}
+        self._tick_id = 0
+
+    def register(self, update_name, update_function, key_function=None):
+        self._updates[update_name] = (update_function, key_function)
+
+    def mark_dirty(self, update_name, value):
+        self.stats['requested'] += 1
+
+        if update_name in self._dirty:
+            self.stats['coalesced'] += 1
+
+        self._dirty[update_name] = value
+
+        if not self._tick_id:
+            self._tick_id = self.widget.add_tick_callback(self._frame)
+
+    def run_now(self, update_name, value):
+        """Runs an update immediately, replacing any pending value"""
+        self._dirty.pop(update_name, None)
+        self._run(update_name, value)
+
+    def invalidate(self, update_name):
+        """Forgets what an update showed last, so the next value is always drawn"""
+        self._drawn.pop(update_name, None)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        frame_ms = sorted(1000 * t for t in self.frame_times)
+
+        if frame_ms:
+            stats.update(mean_frame_ms=round(sum(frame_ms) / len(frame_ms), 3),
+                         p95_frame_ms=round(frame_ms[int(0.95 * (len(frame_ms) - 1))], 3),
+                         max_frame_ms=round(frame_ms[-1], 3))
+
+        return stats
+
+    def log_stats(self):
+        LOG.info('{} frame updates: {}'.format(self.name, self.get_stats()))
+
+    def _run(self, update_name, value):
+        update_function, key_function = self._updates[update_name]
+        key = key_function(value) if key_function is not None else value
+
+        if self._drawn.get(update_name, _NOT_DRAWN) == key:
+            self.stats['unchanged'] += 1
+            return
+
+        self._drawn[update_name] = key
+        self.stats['run'] += 1
+        update_function(value)
+
+    def _frame(self, widget, frame_clock):
+        start = time.perf_counter()
+        dirty, self._dirty = self._dirty, {}
+
+        for update_name, value in dirty.items():
+            self._run(update_name, value)
+
+        self.stats['frames'] += 1
+        self.frame_times.append(time.perf_counter() - start)
+
+        if self._dirty:
+            return True  # an update marked something else as dirty, draw it in the next frame
+
+        self._tick_id = 0
+        return False
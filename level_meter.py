@@ -0,0 +1,124 @@
+import logging
+import queue
+
+import gi
+import numpy as np
+
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GLib
+
+from monitor_refresh import AdaptiveRefresh
+
+LOG = logging.getLogger('epic_narrator.level_meter')
+
+
+class LevelMeter(Gtk.DrawingArea):
+    """Microphone monitor drawn with Cairo from a ring buffer, redrawn only when audio arrives"""
+
+    def __init__(self, controller, refresh_interval_ms=30, idle_interval_ms=250, y_range=0.25, level_bar_width=6):
+        Gtk.DrawingArea.__init__(self)
+        self.controller = controller
+        self.y_range = y_range
+        self.level_bar_width = level_bar_width
+        window_length, n_channels = self.controller.get_recorder_window_size()
+        self.data = np.zeros((window_length, n_channels), dtype=np.float32)
+        self.write_idx = 0  # where the next sample goes, i.e. the oldest sample
+        self.level = 0
+        self.is_recording = False
+
+        self.set_size_request(100, 50)
+        self.connect('draw', self.draw)
+        self._handler_id = self.controller.signal_sender.connect('recording_state_changed',
+                                                                 self.change_recording_state)
+        self._timeout_id = 0
+        self.refresh = AdaptiveRefresh(self, self.set_refresh_interval, active_interval_ms=refresh_interval_ms,
+                                       idle_interval_ms=idle_interval_ms)
+
+    def set_refresh_interval(self, interval_ms):
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = 0
+
+        if interval_ms is not None:
+            self.read_recorder_data()  # catch up with what arrived while we were not looking
+            self._timeout_id = GLib.timeout_add(interval_ms, self.update_mic_monitor)
+
+    def stop(self):
+        self.refresh.stop()
+        self.controller.signal_sender.disconnect(self._handler_id)
+
+    def append(self, block):
+        block = block[-len(self.data):]
+        n = len(block)
+        first = min(n, len(self.data) - self.write_idx)
+        self.data[self.write_idx:self.write_idx + first] = block[:first]
+        self.data[:n - first] = block[first:]
+        self.write_idx = (self.write_idx + n) % len(self.data)
+        self.level = float(np.abs(block).max()) if n else 0
+
+    def read_recorder_data(self):
+        """Returns the peak level of the data read, None if there was none"""
+        level = None
+
+        while True:
+            try:
+                block = self.controller.get_recorder_data()
+            except queue.Empty:
+                break
+
+            self.append(block)
+            level = max(level or 0, self.level)
+
+        if level is not None:
+            self.queue_draw()
+
+        return level
+
+    def update_mic_monitor(self):
+        self.refresh.data_received(self.read_recorder_data())
+        return True
+
+    def get_window(self):
+        """The buffer in chronological order"""
+        return np.concatenate((self.data[self.write_idx:], self.data[:self.write_idx]))
+
+    def draw(self, widget, cr):
+        width = self.get_allocated_width()
+        height = self.get_allocated_height()
+        wave_width = max(1, width - self.level_bar_width - 2)
+        middle = height / 2
+        scale = middle / self.y_range
+        colour = (1, 0.2, 0) if self.is_recording else (1, 1, 1)
+
+        cr.set_source_rgb(0, 0, 0)
+        cr.paint()
+
+        # one vertical segment per column, from the lowest to the highest sample in it
+        window = self.get_window()
+        n_columns = min(wave_width, len(window))
+        bounds = np.linspace(0, len(window), n_columns + 1).astype(np.int64)[:-1]
+        highest = np.clip(np.maximum.reduceat(window, bounds, axis=0).max(axis=1), -self.y_range, self.y_range)
+        lowest = np.clip(np.minimum.reduceat(window, bounds, axis=0).min(axis=1), -self.y_range, self.y_range)
+        column_width = wave_width / n_columns
+
+        cr.set_source_rgb(*colour)
+        cr.set_line_width(max(1, column_width))
+
+        for column, (high, low) in enumerate(zip(middle - highest * scale, middle - lowest * scale)):
+            x = (column + 0.5) * column_width
+            cr.move_to(x, high - 0.5)
+            cr.line_to(x, low + 0.5)
+
+        cr.stroke()
+
+        # peak level of the latest block, full height at y_range
+        bar_height = min(1, self.level / self.y_range) * height
+        cr.rectangle(width - self.level_bar_width, height - bar_height, self.level_bar_width, bar_height)
+        cr.fill()
+
+        return False
+
+    def change_recording_state(self, sender, state):
+        self.is_recording = state == 'recording'
+        self.refresh.set_recording(self.is_recording)
+        self.queue_draw()
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+
+import vlc
+
+LOG = logging.getLogger('epic_narrator.media_info')
+
+
+def probe_video(vlc_instance, video_path, timeout_ms=5000):
+    """Reads duration, fps and resolution of a video without playing it, None if it fails"""
+    media = vlc_instance.media_new_path(video_path)
+    parsed = threading.Event()
+    media.event_manager().event_attach(vlc.EventType.MediaParsedChanged, lambda *args: parsed.set())
+    media.parse_with_options(vlc.MediaParseFlag.local, timeout_ms)
+    parsed.wait(timeout_ms / 1000)
+
+    if media.get_parsed_status() != vlc.MediaParsedStatus.done:
+        LOG.error('Could not parse {} (status={})'.format(video_path, media.get_parsed_status()))
+        media.release()
+        return None
+
+    metadata = {'duration_ms': media.get_duration(), 'fps': None, 'width': None, 'height': None}
+
+    for track in media.tracks_get() or []:
+        if track.type == vlc.TrackType.video:
+            video = track.u.video.contents
+            metadata.update(width=video.width, height=video.height)
+
+            if video.frame_rate_den > 0:
+                metadata['fps'] = video.frame_rate_num / video.frame_rate_den
+
+            break
+
+    media.release()
+
+    if metadata['duration_ms'] <= 0:
+        return None
+
+    return metadata
+
+
+class VideoMetadataCache:
+    """Persistent and thread safe cache of video metadata, invalidated when a video changes"""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                LOG.error('Could not read video metadata cache {}: {}'.format(cache_path, e))
+
+    @staticmethod
+    def _key(video_path):
+        stat = os.stat(video_path)
+        return os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, video_path):
+        path, size, mtime_ns = self._key(video_path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+
+        if entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+            return entry['metadata']
+
+        return None
+
+    def put(self, video_path, metadata):
+        path, size, mtime_ns = self._key(video_path)
+
+        with self._lock:
+            self._entries[path] = {'size': size, 'mtime_ns': mtime_ns, 'metadata': metadata}
+            tmp_path = self.cache_path + '.tmp'
+
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+
+            os.replace(tmp_path, self.cache_path)
+
+    def get_or_probe(self, vlc_instance, video_path):
+        metadata = self.get(video_path)
+
+        if metadata is None:
+            LOG.info('Probing {}'.format(video_path))
+            metadata = probe_video(vlc_instance, video_path)
+
+            if metadata is not None:
+                self.put(video_path, metadata)
+
+        return metadata
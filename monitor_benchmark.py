@@ -0,0 +1,103 @@
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GLib
+
+from controller import Controller
+from fake_backend import FakeRecorder
+from ui import MIC_MONITORS, create_mic_monitor
+
+LOG = logging.getLogger('epic_narrator')
+
+# Shows each microphone monitor on its own in a window, fed by the simulated microphone, and measures the CPU time
+# used by the whole process while it runs. A run without any monitor gives the cost of the simulated microphone
+# itself. Needs a display, e.g. run it with xvfb-run on a headless machine
+
+parser = argparse.ArgumentParser(
+        description="CPU benchmark of the EPIC Narrator microphone monitors",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+)
+parser.add_argument('--duration', type=float, default=10, help='Seconds to run each monitor for')
+parser.add_argument('--monitors', nargs='+', default=['none'] + list(MIC_MONITORS),
+                    choices=['none'] + list(MIC_MONITORS))
+parser.add_argument('--recording', action='store_true', help='Show the monitors in their recording state')
+parser.add_argument('--verbosity', default='warning', choices=['debug', 'info', 'warning', 'error', 'critical'])
+
+
+class MonitorBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.work_dir = tempfile.mkdtemp(prefix='epic_narrator_monitor_benchmark_')
+        os.environ['HOME'] = self.work_dir  # settings are saved under the home folder
+        self.controller = Controller('headless', recorder_class=FakeRecorder, extract_thumbnails=False)
+        self.loop = GLib.MainLoop()
+        self.draws = 0
+
+    def count_draw(self, *args):
+        self.draws += 1
+        return False
+
+    def run_monitor(self, kind):
+        window = Gtk.Window(title='Monitor benchmark: {}'.format(kind))
+        window.set_default_size(300, 60)
+        monitor = None
+
+        if kind != 'none':
+            monitor = create_mic_monitor(self.controller, kind)
+            monitor.connect_after('draw', self.count_draw)
+            window.add(monitor)
+
+        window.show_all()
+
+        if self.args.recording:
+            self.controller.signal_sender.emit('recording_state_changed', 'recording')
+
+        self.draws = 0
+        GLib.timeout_add(int(self.args.duration * 1000), self.loop.quit)
+        start_cpu, start_time = time.process_time(), time.perf_counter()
+        self.loop.run()
+        cpu, elapsed = time.process_time() - start_cpu, time.perf_counter() - start_time
+
+        if monitor is not None:
+            monitor.stop()
+
+        window.destroy()
+
+        return cpu, elapsed
+
+    def run(self):
+        results = []
+
+        for kind in self.args.monitors:
+            cpu, elapsed = self.run_monitor(kind)
+            results.append((kind, cpu, elapsed, self.draws))
+
+        self.controller.recorder.close_stream()
+
+        if self.controller.peaks_worker is not None:
+            self.controller.peaks_worker.stop()
+
+        self.controller.prefetcher.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+        print('{:<12} {:>10} {:>8} {:>10}'.format('monitor', 'CPU time', 'CPU', 'draws/s'))
+
+        for kind, cpu, elapsed, draws in results:
+            print('{:<12} {:>9.2f}s {:>7.1f}% {:>10.1f}'.format(kind, cpu, 100 * cpu / elapsed, draws / elapsed))
+
+
+def main(args):
+    logging.basicConfig(stream=sys.stderr)
+    LOG.setLevel(getattr(logging, args.verbosity.upper()))
+    MonitorBenchmark(args).run()
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+import logging
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gdk
+
+LOG = logging.getLogger('epic_narrator.monitor_refresh')
+
+
+class AdaptiveRefresh:
+    """Chooses how often a microphone monitor refreshes, None meaning not at all"""
+
+    def __init__(self, widget, set_interval_function, active_interval_ms=30, idle_interval_ms=250,
+                 silence_level=0.01, silence_hold_ms=1000):
+        self.widget = widget
+        self.set_interval_function = set_interval_function
+        self.active_interval_ms = active_interval_ms
+        self.idle_interval_ms = idle_interval_ms
+        self.silence_level = silence_level
+        self.silence_hold_ms = silence_hold_ms
+        self.is_recording = False
+        self.is_silent = False
+        self.silent_for_ms = 0
+        self.interval_ms = None
+        self.toplevel = None
+        self.window_state_handler_id = 0
+
+        self.widget.connect('map', self.visibility_changed)
+        self.widget.connect('unmap', self.visibility_changed)
+        self.update()
+
+    def is_hidden(self):
+        if not self.widget.get_mapped():
+            return True
+
+        window = self.widget.get_toplevel().get_window()
+
+        return window is not None and bool(window.get_state() & Gdk.WindowState.ICONIFIED)
+
+    def get_interval(self):
+        if self.is_hidden():
+            return None
+
+        if self.is_recording or not self.is_silent:
+            return self.active_interval_ms
+
+        return self.idle_interval_ms
+
+    def update(self):
+        interval_ms = self.get_interval()
+
+        if interval_ms != self.interval_ms:
+            LOG.debug('Monitor refresh interval: {}ms'.format(interval_ms))
+            self.interval_ms = interval_ms
+            self.set_interval_function(interval_ms)
+
+    def data_received(self, level):
+        """level is the peak of the audio received since the last refresh, None if nothing arrived"""
+        if level is not None and level >= self.silence_level:
+            self.silent_for_ms = 0
+            self.is_silent = False
+        elif self.interval_ms is not None:
+            self.silent_for_ms += self.interval_ms
+            self.is_silent = self.silent_for_ms >= self.silence_hold_ms
+
+        self.update()
+
+    def set_recording(self, is_recording):
+        self.is_recording = is_recording
+        self.update()
+
+    def visibility_changed(self, *args):
+        toplevel = self.widget.get_toplevel()
+
+        # minimising the window does not unmap its widgets, so we follow the state of the window too
+        if toplevel is not self.toplevel and toplevel.is_toplevel():
+            if self.window_state_handler_id:
+                self.toplevel.disconnect(self.window_state_handler_id)
+
+            self.toplevel = toplevel
+            self.window_state_handler_id = toplevel.connect('window-state-event', self.visibility_changed)
+
+        self.update()
+        return False
+
+    def stop(self):
+        if self.window_state_handler_id:
+            self.toplevel.disconnect(self.window_state_handler_id)
+            self.window_state_handler_id = 0
+
+        if self.interval_ms is not None:
+            self.interval_ms = None
+            self.set_interval_function(None)
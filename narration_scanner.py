@@ -0,0 +1,186 @@
+import bisect
+import csv
+import logging
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from peaks import remove_peaks
+from scan_cache import QUARANTINE_FOLDER, ScanCache, find_recordings
+
+LOG = logging.getLogger('epic_narrator.narration_scanner')
+
+FRAME_MS = 10
+FINGERPRINT_BITS = 64
+
+
+def analyse_recording(path):
+    """Computes cheap statistics and a 64 bits energy envelope fingerprint of a recording"""
+    try:
+        samples, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    except Exception as e:
+        return {'error': str(e)}
+
+    samples = samples.mean(axis=1)
+    frame_length = max(1, int(sample_rate * FRAME_MS / 1000))
+    n_frames = len(samples) // frame_length
+    stats = {'duration_ms': int(1000 * len(samples) / sample_rate), 'peak_db': -120.0, 'rms_db': -120.0,
+             'active_ratio': 0.0, 'fingerprint': None}
+
+    if n_frames == 0:
+        return stats
+
+    frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length)
+    frames_rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    frames_db = 20 * np.log10(np.maximum(frames_rms, 1e-6))
+    stats['peak_db'] = float(20 * np.log10(max(float(np.abs(samples).max()), 1e-6)))
+    stats['rms_db'] = float(20 * np.log10(max(float(np.sqrt(np.mean(np.square(samples)))), 1e-6)))
+    stats['active_ratio'] = float(np.mean(frames_db > -45))
+
+    # one bit per envelope segment: set if the energy rises with respect to the previous segment
+    envelope = np.interp(np.linspace(0, n_frames - 1, FINGERPRINT_BITS + 1), np.arange(n_frames), frames_db)
+    bits = np.diff(envelope) > 0
+    stats['fingerprint'] = int(np.packbits(bits).view('>u8')[0])
+
+    return stats
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class NarrationScanner:
+    def __init__(self, root, min_duration_ms=300, silence_peak_db=-40, min_active_ratio=0.02,
+                 duplicate_window_ms=2000, duplicate_max_distance=10, duplicate_duration_ratio=0.8,
+                 processes=None):
+        self.root = os.path.abspath(root)
+        self.min_duration_ms = min_duration_ms
+        self.silence_peak_db = silence_peak_db
+        self.min_active_ratio = min_active_ratio
+        self.duplicate_window_ms = duplicate_window_ms
+        self.duplicate_max_distance = duplicate_max_distance
+        self.duplicate_duration_ratio = duplicate_duration_ratio
+        self.processes = processes
+
+    def analyse(self):
+        """Returns {path: stats} for all the recordings under root, analysing only new or modified files"""
+        cache = ScanCache(self.root, 'narration_stats')
+        files = list(find_recordings(self.root))
+        results, stale = cache.split(files)
+        LOG.info('Found {} recordings under {} ({} cached, {} to analyse)'.format(len(files), self.root,
+                                                                                len(results), len(stale)))
+
+        if stale:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                stats = list(executor.map(analyse_recording, [f[0] for f in stale], chunksize=32))
+
+            cache.put_many((path, size, mtime_ns, s) for (path, size, mtime_ns), s in zip(stale, stats))
+            results.update((f[0], s) for f, s in zip(stale, stats))
+
+        cache.prune(results.keys())
+        cache.close()
+
+        return results
+
+    def classify(self, stats):
+        if 'error' in stats:
+            return 'unreadable'
+        elif stats['duration_ms'] < self.min_duration_ms:
+            return 'too_short'
+        elif stats['peak_db'] < self.silence_peak_db or stats['active_ratio'] < self.min_active_ratio:
+            return 'silent'
+        else:
+            return None
+
+    def find_duplicates(self, results):
+        """Returns {path: original path} for recordings that sound like a recording made just before them"""
+        folders = {}
+
+        for path, stats in results.items():
+            if stats.get('fingerprint') is not None and self.classify(stats) is None:
+                try:
+                    time_ms = int(os.path.splitext(os.path.basename(path))[0])
+                except ValueError:
+                    continue
+
+                folders.setdefault(os.path.dirname(path), []).append((time_ms, path))
+
+        duplicates = {}
+
+        for recordings in folders.values():
+            recordings.sort()
+            times = [t for t, _ in recordings]
+
+            for idx, (time_ms, path) in enumerate(recordings):
+                stats = results[path]
+                first = bisect.bisect_left(times, time_ms - self.duplicate_window_ms, hi=idx)
+
+                for other_time, other_path in recordings[first:idx]:
+                    if other_path in duplicates:
+                        continue
+
+                    other = results[other_path]
+                    durations = sorted([stats['duration_ms'], other['duration_ms']])
+
+                    if durations[0] >= self.duplicate_duration_ratio * durations[1] and \
+                            hamming_distance(stats['fingerprint'], other['fingerprint']) <= \
+                            self.duplicate_max_distance:
+                        duplicates[path] = other_path
+                        break
+
+        return duplicates
+
+    def scan(self):
+        """Returns a list of report rows (dicts) for the flagged recordings, sorted by path"""
+        results = self.analyse()
+        duplicates = self.find_duplicates(results)
+        report = []
+
+        for path in sorted(results):
+            stats = results[path]
+            issue = self.classify(stats)
+
+            if issue is None and path in duplicates:
+                issue = 'duplicate'
+
+            if issue is not None:
+                report.append({'path': path, 'issue': issue,
+                               'duplicate_of': duplicates.get(path, ''),
+                               'duration_ms': stats.get('duration_ms', ''),
+                               'peak_db': round(stats['peak_db'], 1) if 'peak_db' in stats else '',
+                               'active_ratio': round(stats['active_ratio'], 3) if 'active_ratio' in stats else ''})
+
+        LOG.info('Flagged {} of {} recordings under {}'.format(len(report), len(results), self.root))
+
+        return report
+
+    def get_quarantine_path(self, path):
+        quarantine_root = os.path.join(os.path.dirname(self.root), QUARANTINE_FOLDER)
+        return os.path.join(quarantine_root, os.path.relpath(path, self.root))
+
+    def quarantine(self, report):
+        """Moves the flagged recordings out of the recordings tree, keeping their relative paths"""
+        for row in report:
+            destination = self.get_quarantine_path(row['path'])
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            LOG.info('Moving {} to {} ({})'.format(row['path'], destination, row['issue']))
+            shutil.move(row['path'], destination)
+            remove_peaks(row['path'])
+            row['path'] = destination
+
+
+def write_report(report, report_path=None):
+    report_file = sys.stdout if report_path is None else open(report_path, 'w', newline='')
+
+    try:
+        writer = csv.DictWriter(report_file, fieldnames=['path', 'issue', 'duplicate_of', 'duration_ms', 'peak_db',
+                                                         'active_ratio'])
+        writer.writeheader()
+        writer.writerows(report)
+    finally:
+        if report_path is not None:
+            report_file.close()
@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+
+def load_pcm(path, sample_rate=None):
+    """Reads a recording as a mono float32 array, optionally resampled to sample_rate. Returns (samples, rate)"""
+    samples, file_rate = sf.read(path, dtype='float32', always_2d=True)
+    samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+    if sample_rate is None or sample_rate == file_rate:
+        return np.ascontiguousarray(samples), file_rate
+
+    return resample(samples, file_rate, sample_rate), sample_rate
+
+
+def resample(samples, rate, target_rate):
+    # linear interpolation is good enough for playing back speech
+    n_target = int(round(len(samples) * target_rate / rate))
+    positions = np.arange(n_target) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class PcmCache:
+    """LRU cache of decoded recordings bounded in bytes, invalidated when a file changes"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, sample_rate=None):
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> (mtime_ns, samples, rate)
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Returns (samples, rate) for path, decoding the file if it is not cached"""
+        mtime_ns = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            entry = self._entries.get(path)
+
+            if entry is not None and entry[0] == mtime_ns:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1], entry[2]
+
+        self.misses += 1
+        samples, rate = load_pcm(path, sample_rate=self.sample_rate)
+        self.put(path, mtime_ns, samples, rate)
+
+        return samples, rate
+
+    def get_cached(self, path):
+        """Returns (samples, rate) for path if it is cached and up to date, otherwise None, without decoding"""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+
+            if entry is None or entry[0] != mtime_ns:
+                return None
+
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, path, mtime_ns, samples, rate):
+        with self._lock:
+            old = self._entries.pop(path, None)
+
+            if old is not None:
+                self.size_bytes -= old[1].nbytes
+
+            if samples.nbytes > self.max_bytes:
+                return
+
+            self._entries[path] = (mtime_ns, samples, rate)
+            self.size_bytes += samples.nbytes
+
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted.nbytes
+
+    def contains(self, path):
+        with self._lock:
+            return path in self._entries
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+
+            if entry is not None:
+                self.size_bytes -= entry[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
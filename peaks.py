@@ -0,0 +1,235 @@
+import glob
+import logging
+import os
+import queue
+import struct
+import threading
+from multiprocessing import Pool
+
+import numpy as np
+import soundfile as sf
+
+LOG = logging.getLogger('epic_narrator.peaks')
+
+# Multi-resolution min/max peak cache, similar in spirit to audiowaveform .dat files.
+# Level 0 stores one (min, max) pair every `samples_per_peak` samples, each following level halves the resolution.
+# Peaks are quantised to int8, so a 10 seconds recording at 48kHz takes roughly 15KB for 8 levels.
+#
+# File layout (little endian):
+#   header: magic (4s), version (H), n_levels (H), sample_rate (I), samples_per_peak (I), n_samples (Q)
+#   levels table: n_levels x (offset in bytes (Q), number of peaks (Q))
+#   data: interleaved int8 (min, max) pairs for each level
+PEAKS_MAGIC = b'EPKP'
+PEAKS_VERSION = 1
+PEAKS_FOLDER = '.peaks'
+PEAKS_EXTENSION = 'dat'
+_HEADER = struct.Struct('<4sHHIIQ')
+_LEVEL_ENTRY = struct.Struct('<QQ')
+
+
+def get_peaks_path(recording_path):
+    folder, filename = os.path.split(recording_path)
+    name = os.path.splitext(filename)[0]
+    return os.path.join(folder, PEAKS_FOLDER, '{}.{}'.format(name, PEAKS_EXTENSION))
+
+
+def peaks_up_to_date(recording_path):
+    peaks_path = get_peaks_path(recording_path)
+
+    try:
+        return os.path.getmtime(peaks_path) >= os.path.getmtime(recording_path)
+    except OSError:
+        return False
+
+
+def remove_peaks(recording_path):
+    try:
+        os.remove(get_peaks_path(recording_path))
+    except FileNotFoundError:
+        pass
+
+
+def compute_peak_levels(samples, samples_per_peak=64, n_levels=8):
+    # samples is a (n_samples, n_channels) float array in [-1, 1]
+    mins = samples.min(axis=1) if samples.ndim > 1 else samples
+    maxs = samples.max(axis=1) if samples.ndim > 1 else samples
+
+    if len(mins) == 0:
+        mins = maxs = np.zeros(1, dtype=np.float32)
+
+    starts = np.arange(0, len(mins), samples_per_peak)
+    level_min = _quantise(np.minimum.reduceat(mins, starts))
+    level_max = _quantise(np.maximum.reduceat(maxs, starts))
+    levels = [(level_min, level_max)]
+
+    for _ in range(1, n_levels):
+        if len(level_min) == 1:
+            break
+
+        if len(level_min) % 2 == 1:
+            level_min = np.append(level_min, level_min[-1])
+            level_max = np.append(level_max, level_max[-1])
+
+        level_min = level_min.reshape(-1, 2).min(axis=1)
+        level_max = level_max.reshape(-1, 2).max(axis=1)
+        levels.append((level_min, level_max))
+
+    return levels
+
+
+def _quantise(values):
+    return np.clip(np.round(values * 127), -128, 127).astype(np.int8)
+
+
+def build_peaks(recording_path, samples_per_peak=64, n_levels=8):
+    peaks_path = get_peaks_path(recording_path)
+    samples, sample_rate = sf.read(recording_path, dtype='float32', always_2d=True)
+    levels = compute_peak_levels(samples, samples_per_peak=samples_per_peak, n_levels=n_levels)
+
+    offset = _HEADER.size + _LEVEL_ENTRY.size * len(levels)
+    header = [_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, len(levels), int(sample_rate), samples_per_peak,
+                           len(samples))]
+
+    for level_min, _ in levels:
+        header.append(_LEVEL_ENTRY.pack(offset, len(level_min)))
+        offset += 2 * len(level_min)
+
+    os.makedirs(os.path.dirname(peaks_path), exist_ok=True)
+    tmp_path = peaks_path + '.tmp'
+
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(header))
+
+        for level_min, level_max in levels:
+            f.write(np.column_stack((level_min, level_max)).tobytes())
+
+    os.replace(tmp_path, peaks_path)
+
+    return peaks_path
+
+
+def build_peaks_if_needed(recording_path, force=False):
+    if not force and peaks_up_to_date(recording_path):
+        return False
+
+    try:
+        build_peaks(recording_path)
+        return True
+    except Exception as e:
+        LOG.error('Could not build peaks for {}: {}'.format(recording_path, e))
+        return False
+
+
+def build_peaks_for_folder(folder, audio_extension='wav', processes=None, force=False):
+    """Builds the peaks of all the recordings found under folder (recursively) with a process pool"""
+    pattern = os.path.join(folder, '**', '*.{}'.format(audio_extension))
+    recordings = [f for f in glob.glob(pattern, recursive=True) if force or not peaks_up_to_date(f)]
+    LOG.info('Building peaks for {} recordings under {}'.format(len(recordings), folder))
+
+    if not recordings:
+        return 0
+
+    with Pool(processes=processes) as pool:
+        built = sum(pool.imap_unordered(_build_forced if force else build_peaks_if_needed, recordings,
+                                        chunksize=16))
+
+    LOG.info('Built peaks for {} recordings under {}'.format(built, folder))
+
+    return built
+
+
+def _build_forced(recording_path):
+    return build_peaks_if_needed(recording_path, force=True)
+
+
+class PeakPyramid:
+    def __init__(self, peaks_path):
+        self.path = peaks_path
+        self._data = np.memmap(peaks_path, dtype=np.int8, mode='r')
+        header = bytes(self._data[:_HEADER.size])
+        magic, version, n_levels, self.sample_rate, self.samples_per_peak, self.n_samples = _HEADER.unpack(header)
+
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+            raise ValueError('{} is not a valid peaks file'.format(peaks_path))
+
+        self.levels = []
+
+        for level in range(n_levels):
+            start = _HEADER.size + level * _LEVEL_ENTRY.size
+            offset, length = _LEVEL_ENTRY.unpack(bytes(self._data[start:start + _LEVEL_ENTRY.size]))
+            self.levels.append(self._data[offset:offset + 2 * length].reshape(-1, 2))
+
+    @classmethod
+    def for_recording(cls, recording_path):
+        if not peaks_up_to_date(recording_path):
+            return None
+
+        try:
+            return cls(get_peaks_path(recording_path))
+        except (OSError, ValueError) as e:
+            LOG.error('Could not open peaks for {}: {}'.format(recording_path, e))
+            return None
+
+    def get_duration_ms(self):
+        return 1000 * self.n_samples / self.sample_rate
+
+    def get_level_samples_per_peak(self, level):
+        return self.samples_per_peak * 2 ** level
+
+    def get_peaks(self, width, start_ms=0, end_ms=None):
+        """Returns two float arrays (mins, maxs) in [-1, 1] with `width` values covering [start_ms, end_ms)"""
+        if width <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        if end_ms is None:
+            end_ms = self.get_duration_ms()
+
+        start_sample = max(0, int(start_ms * self.sample_rate / 1000))
+        end_sample = min(self.n_samples, int(end_ms * self.sample_rate / 1000))
+        samples_per_pixel = max(1, (end_sample - start_sample) / max(1, width))
+
+        # pick the coarsest level that still has at least one peak per pixel
+        level = 0
+
+        while level + 1 < len(self.levels) and self.get_level_samples_per_peak(level + 1) <= samples_per_pixel:
+            level += 1
+
+        peaks = self.levels[level]
+        spp = self.get_level_samples_per_peak(level)
+        first = min(len(peaks) - 1, start_sample // spp)
+        last = max(first + 1, min(len(peaks), -(-end_sample // spp)))
+        peaks = np.asarray(peaks[first:last], dtype=np.float32) / 127
+        starts = np.linspace(0, len(peaks), num=width, endpoint=False).astype(np.intp)
+
+        return np.minimum.reduceat(peaks[:, 0], starts), np.maximum.reduceat(peaks[:, 1], starts)
+
+
+class PeaksWorker:
+    """Builds peaks in a background thread, so recordings are never decoded in the UI thread"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='peaks_worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, recording_path, force=False):
+        self._queue.put((recording_path, force))
+
+    def submit_missing(self, recording_paths):
+        for path in recording_paths:
+            self.submit(path)
+
+    def stop(self):
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+
+            if item is None:
+                break
+
+            recording_path, force = item
+
+            if os.path.exists(recording_path) and build_peaks_if_needed(recording_path, force=force):
+                LOG.debug('Built peaks for {}'.format(recording_path))
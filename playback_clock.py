@@ -0,0 +1,86 @@
+import threading
+import time
+
+
+class PlaybackClock:
+    """Playback position interpolated between the time updates of the player. Thread safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._base_ms = 0
+        self._base_clock = time.monotonic()
+        self._playing = False
+        self._rate = 1.0
+        self._length_ms = 0
+        self._command = None  # (sequence number, playing) of the last play or pause command
+        self.syncs = 0
+        self.commands = 0
+        self.ignored_events = 0
+
+    def _now_unlocked(self):
+        position = self._base_ms
+
+        if self._playing:
+            position += 1000 * (time.monotonic() - self._base_clock) * self._rate
+
+        if self._length_ms > 0:
+            position = min(position, self._length_ms)
+
+        return max(0, int(position))
+
+    def _anchor(self, time_ms):
+        self._base_ms = time_ms
+        self._base_clock = time.monotonic()
+
+    def now(self):
+        with self._lock:
+            return self._now_unlocked()
+
+    def sync(self, time_ms):
+        with self._lock:
+            self.syncs += 1
+            self._anchor(time_ms)
+
+    def set_playing(self, playing):
+        # a play or pause command, player events contradicting it are ignored until the next one
+        with self._lock:
+            self.commands += 1
+            self._command = (self.commands, playing)
+            self._anchor(self._now_unlocked())
+            self._playing = playing
+
+    def playing_changed(self, playing):
+        """Applies a player event unless it contradicts the last command, then returns its number"""
+        with self._lock:
+            if self._command is not None and self._command[1] != playing:
+                self.ignored_events += 1
+                return self._command[0]
+
+            self._anchor(self._now_unlocked())
+            self._playing = playing
+            return None
+
+    def is_playing(self):
+        with self._lock:
+            return self._playing
+
+    def get_state(self):
+        with self._lock:
+            return {'playing': self._playing, 'rate': self._rate, 'time_ms': self._now_unlocked(),
+                    'length_ms': self._length_ms}
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._anchor(self._now_unlocked())
+            self._rate = rate
+
+    def set_length(self, length_ms):
+        with self._lock:
+            self._length_ms = length_ms
+
+    def reset(self):
+        with self._lock:
+            self._anchor(0)
+            self._playing = False
+            self._command = None
+            self._length_ms = 0
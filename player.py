@@ -1,22 +1,50 @@
 import ctypes
 import logging
+import os
 import threading
+import time
+import traceback
 
 import vlc
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import GLib
 
+from media_info import VideoMetadataCache, probe_video
+from playback_clock import PlaybackClock
+from prefetch import warm_file
+from proxy import ProxyBuilder
+from recording_player import RecordingPlayer
+from seek_scheduler import SeekScheduler
+from settings import Settings
+
 LOG = logging.getLogger('epic_narrator.player')
 
+
+def create_vlc_instance():
+    # loading the vlc plugins takes a while, this can be done in the background before the player is created
+    return vlc.Instance('--no-xlib')
+
+
 class Player:
-    def __init__(self, widget, controller):
+    def __init__(self, widget, controller, vlc_instance=None):
         LOG.info('Creating VLC player')
         self.controller = controller
-        self.vlc_instance = vlc.Instance('--no-xlib')
+        self.vlc_instance = vlc_instance if vlc_instance is not None else create_vlc_instance()
         self.video_player = self.vlc_instance.media_player_new()
         self.rec_player = self.vlc_instance.media_player_new()
         self.video_length = 0
+        self.video_path = None
+        self._load_id = 0  # changes with every load_video, to ignore probes of videos that are not current
+        self.video_metadata = None
+        self._waiting_for_length = False
+        self.proxy_builder = None
+        self.proxy_path = None
+        self._scrubbing = False
+        self.metadata_cache = VideoMetadataCache(os.path.join(Settings.get_epic_narrator_directory(),
+                                                              'video_metadata.json'))
+        self.clock = PlaybackClock()
+        self._muted = False
         self.set_vlc_window(widget, controller.this_os)
         self.mute_video()
         self._seeking_timeout = 0
@@ -25,6 +53,24 @@ class Player:
         self.is_dragging = False
         self.seek_refresh = 50  # milliseconds
         self.seek_step = 500  # milliseconds
+        self.seek_acceleration_ticks = 20  # the step grows by seek_step every 20 ticks while seeking
+        self.max_seek_acceleration = 4
+        self._seek_ticks = 0
+        self.seek_scheduler = SeekScheduler(self.video_player.set_time, landing_tolerance_ms=self.seek_step // 4)
+        self.recording_player = None
+
+        # position changed events are coalesced: at most one dispatch is pending in the main loop at any time
+        self._moving_lock = threading.Lock()
+        self._moving_pending = False
+        self._last_moving_position = None
+        self._moving_received_at = None
+        self.moving_events = {'received': 0, 'merged': 0, 'dispatched': 0, 'dropped': 0}
+
+        if controller.get_setting('low_latency_rec_playback', False):
+            self.set_low_latency_recording_playback(True)
+
+        if controller.get_setting('use_seek_proxy', False):
+            self.set_seek_proxy_enabled(True)
 
         # from lib vlc documentation. Make sure you don't use wait anywhere in the program
         '''
@@ -43,6 +89,14 @@ class Player:
         main_events.event_attach(vlc.EventType.MediaPlayerEndReached, self.video_ended_handler)
         main_events.event_attach(vlc.EventType.MediaPlayerLengthChanged, self.video_loaded_handler)
 
+        # the clock is thread safe, so these handlers can update it directly from the vlc threads
+        main_events.event_attach(vlc.EventType.MediaPlayerTimeChanged, self.video_time_changed_handler)
+        main_events.event_attach(vlc.EventType.MediaPlayerPlaying, self.video_playing_handler)
+        main_events.event_attach(vlc.EventType.MediaPlayerPaused, self.video_paused_handler)
+        main_events.event_attach(vlc.EventType.MediaPlayerStopped, self.video_paused_handler)
+        main_events.event_attach(vlc.EventType.MediaPlayerMuted, self.video_muted_handler, True)
+        main_events.event_attach(vlc.EventType.MediaPlayerUnmuted, self.video_muted_handler, False)
+
         rec_events = self.rec_player.event_manager()
         rec_events.event_attach(vlc.EventType.MediaPlayerStopped, self.finished_playing_recording_handler)
 
@@ -77,84 +131,276 @@ class Player:
 
     def shutting_down(self):
         LOG.info('Releasing vlc instance (thread={})'.format(threading.current_thread().getName()))
+        LOG.info('Position changed events: {}'.format(self.moving_events))
+        LOG.info('Seeks: {}'.format(self.seek_scheduler.get_stats()))
+        self.seek_scheduler.reset()
+
+        if self.proxy_builder is not None:
+            self.proxy_builder.cancel()
 
         self.video_player.stop()
         self.rec_player.stop()
         self.vlc_instance.release()
 
+        if self.recording_player is not None:
+            self.recording_player.close()
+
     def load_video(self, video_path):
         LOG.info('Loading video {} (thread={})'.format(video_path, threading.current_thread().getName()))
+
+        if video_path != self.video_path:
+            self.proxy_path = None
+
+        self.video_path = video_path
+        self._scrubbing = False
+        self._load_id += 1
+        metadata = self.metadata_cache.get(video_path)
+
+        if metadata is not None:
+            self._open_video(video_path, metadata)
+            return
+
+        # parsing can take seconds, so it is done in a worker and the video is opened when it is done
+        thread = threading.Thread(target=self._probe_video, args=(video_path, self._load_id), name='video_probe',
+                                  daemon=True)
+        thread.start()
+
+    def _probe_video(self, video_path, load_id):
+        # this is called from a background thread, the metadata cache is thread safe
+        metadata = self.metadata_cache.get_or_probe(self.vlc_instance, video_path)
+        GLib.idle_add(self._video_probed, video_path, load_id, metadata)
+
+    def _video_probed(self, video_path, load_id, metadata):
+        if load_id == self._load_id:  # otherwise another video was loaded meanwhile
+            self._open_video(video_path, metadata)
+
+        return False
+
+    def _open_video(self, video_path, metadata):
+        self.video_metadata = metadata
         media = self.vlc_instance.media_new_path(video_path)
-        self.video_player.set_mrl(media.get_mrl())
-        self.play_video()  # we need to play the video for a while to get the length in milliseconds
+
+        if self.video_metadata is not None:
+            # we know the length already, so we just need the video to be opened and paused on its first frame
+            LOG.info('Video metadata: {}'.format(self.video_metadata))
+            media.add_option(':start-paused')
+            self._waiting_for_length = False
+            self.video_player.set_media(media)
+            self.video_player.play()
+            self.clock.set_playing(False)  # it opens paused, the Playing and Stopped events of the load are ignored
+            self.video_length = self.video_metadata['duration_ms']
+            GLib.idle_add(self.video_loaded)
+        else:
+            self._waiting_for_length = True
+            self.video_length = 0
+            self.video_player.set_mrl(media.get_mrl())
+            self.play_video()  # we need to play the video for a while to get the length in milliseconds
+
+    def prepare_video(self, video_path):
+        # this is called from a background thread: it only parses the video with the vlc instance, and the metadata
+        # cache is thread safe, so load_video will not need to probe it again
+        return self.metadata_cache.get_or_probe(self.vlc_instance, video_path)
 
     def video_loaded_handler(self, *args):
-        GLib.idle_add(self.video_loaded)
+        if self._waiting_for_length:
+            self._waiting_for_length = False
+            GLib.idle_add(self.video_loaded)
+
+    def video_time_changed_handler(self, event):
+        self.clock.sync(event.u.new_time)
+
+    def video_playing_handler(self, *args):
+        self.playing_changed(True)
+
+    def video_paused_handler(self, *args):
+        self.playing_changed(False)
+
+    def playing_changed(self, playing):
+        # this is called from the vlc threads. Events can arrive after a newer command, the command wins
+        command = self.clock.playing_changed(playing)
+
+        if command is not None:
+            LOG.debug('Ignored {} event, it contradicts command {}'.format('playing' if playing else 'paused',
+                                                                         command))
+
+    def video_muted_handler(self, event, muted):
+        self._muted = muted
 
     def video_loaded(self):
         LOG.info('Video loaded (thread={})'.format(threading.current_thread().getName()))
         self.pause_video()
         self.video_length = self.get_video_length()
+        self.clock.set_length(self.video_length)
+
+        if self.proxy_builder is not None:
+            self.proxy_builder.request(self.video_path, self.video_length, self.proxy_ready)
+
         self.controller.video_loaded()
 
+    def set_seek_proxy_enabled(self, enabled):
+        LOG.info('Setting seek proxy to {}'.format(enabled))
+
+        if enabled and self.proxy_builder is None:
+            self.proxy_builder = ProxyBuilder(os.path.join(Settings.get_epic_narrator_directory(), 'proxies'),
+                                              lambda path: probe_video(self.vlc_instance, path))
+
+            if self.video_path is not None and self.video_length > 0:
+                self.proxy_builder.request(self.video_path, self.video_length, self.proxy_ready)
+        elif not enabled and self.proxy_builder is not None:
+            self.proxy_builder.cancel()
+            self.proxy_builder = None
+            self.proxy_path = None
+
+    def proxy_ready(self, video_path, proxy_path):
+        if video_path == self.video_path and self.proxy_builder is not None:
+            LOG.info('Using proxy {} for seeking'.format(proxy_path))
+            self.proxy_path = proxy_path
+
+    def _open_media(self, path, start_ms, paused):
+        media = self.vlc_instance.media_new_path(path)
+
+        if paused:
+            media.add_option(':start-paused')
+
+        if start_ms > 0:
+            media.add_option(':start-time={:.3f}'.format(start_ms / 1000))
+
+        self.seek_scheduler.reset()
+        self.video_player.set_media(media)
+        self.video_player.play()
+        self.clock.set_playing(not paused)
+        self.clock.sync(start_ms)
+
+    def start_scrubbing(self):
+        # while scrubbing we show the proxy, which has the same timestamps as the video
+        if self.proxy_path is None or self._scrubbing:
+            return
+
+        LOG.info('Switching to proxy for scrubbing (thread={})'.format(threading.current_thread().getName()))
+        self._scrubbing = True
+        self._open_media(self.proxy_path, self.get_current_position(), paused=True)
+
+    def stop_scrubbing(self, time_ms=None, resume=False):
+        if not self._scrubbing:
+            return False
+
+        LOG.info('Switching back to video after scrubbing (thread={})'.format(threading.current_thread().getName()))
+        time_ms = self.get_current_position() if time_ms is None else time_ms
+        self._scrubbing = False
+        self._open_media(self.video_path, time_ms, paused=not resume)
+
+        return True
+
     def get_video_length(self):
         LOG.info('Getting video length (thread={})'.format(threading.current_thread().getName()))
+
+        if self.video_length > 0:
+            return self.video_length
+
         return self.video_player.get_length()
 
     def play_video(self):
         LOG.info('Playing video (thread={})'.format(threading.current_thread().getName()))
         self.video_player.play()
+        self.clock.set_playing(True)  # start the clock now, so is_playing is right before vlc confirms it
 
     def pause_video(self):
         LOG.info('Pausing video (thread={})'.format(threading.current_thread().getName()))
         self.video_player.set_pause(True)
+        self.clock.set_playing(False)  # freeze the clock now, so timestamps taken right after are exact
 
     def set_speed(self, speed):
         LOG.info('Setting playback speed to {} (thread={})'.format(speed, threading.current_thread().getName()))
         self.video_player.set_rate(speed)
+        self.clock.set_rate(speed)
 
     def mute_video(self):
         LOG.info('Mute video (thread={})'.format(threading.current_thread().getName()))
         self.video_player.audio_set_mute(True)
+        self._muted = True
 
     def unmute_video(self):
         LOG.info('Unmute video (thread={})'.format(threading.current_thread().getName()))
         self.video_player.audio_set_mute(False)
+        self._muted = False
 
     def get_current_position(self):
         # this is called constantly as the video plays, avoid logging
-        return max(0, self.video_player.get_time())
+        # while a seek is in flight we are already where we have been asked to go
+        seek_target = self.seek_scheduler.get_target()
+
+        if seek_target is not None:
+            return seek_target
+
+        return self.clock.now()
 
+    # the state of the player is mirrored from the vlc events (and from our own commands), so these are cheap
+    # and do not call into vlc. They are called constantly, avoid logging
     def is_playing(self):
-        LOG.info('Checking if video is playing (thread={})'.format(threading.current_thread().getName()))
-        return self.video_player.is_playing()
+        return self.clock.is_playing()
 
     def is_mute(self):
-        LOG.info('Checking if video is mute (thread={})'.format(threading.current_thread().getName()))
-        return self.video_player.audio_get_mute()
+        return self._muted
+
+    def get_state(self):
+        """Snapshot of the playback state: playing, muted, rate, time_ms and length_ms"""
+        state = self.clock.get_state()
+        state['muted'] = self._muted
+
+        return state
 
     def is_seeking(self):
         # this is called constantly as the video plays, avoid logging
         return self._is_seeking or self._seeking_timeout != 0
 
     def video_moving_handler(self, *args):
+        # if a dispatch is already pending it will read the latest position, so we merge this event into it
+        with self._moving_lock:
+            self.moving_events['received'] += 1
+            self._moving_received_at = time.monotonic()
+
+            if self._moving_pending:
+                self.moving_events['merged'] += 1
+                return
+
+            self._moving_pending = True
+
         # this will be run in the main thread when possible
         GLib.idle_add(self.video_moving, priority=GLib.PRIORITY_HIGH)
 
     def video_moving(self):
         # this is called constantly as the video plays, avoid logging
-        self.controller.signal_sender.emit('video_moving', self.get_current_position(), self.is_seeking())
+        with self._moving_lock:
+            self._moving_pending = False
+            received_at = self._moving_received_at
+
+        self.seek_scheduler.position_changed(self.clock.now(), received_at)
+        position = self.get_current_position()
+        is_seeking = self.is_seeking()
+
+        # nothing to update if vlc reported a position we already dispatched
+        if position == self._last_moving_position and not is_seeking:
+            self.moving_events['dropped'] += 1
+            return False
+
+        self._last_moving_position = position
+        self.moving_events['dispatched'] += 1
+        self.controller.signal_sender.emit('video_moving', position, is_seeking)
+
+        return False
 
     def start_seek(self, direction):
         LOG.info('Start seeking (thread={})'.format(threading.current_thread().getName()))
 
-        if self.video_player.is_playing():
+        if self.is_playing():
             self.pause_video()
             self.was_playing_before_seek = True
         else:
             self.was_playing_before_seek = False
 
+        self.start_scrubbing()
         step = self.seek_step if direction == 'forward' else - self.seek_step
+        self._seek_ticks = 0
         self._seeking_timeout = GLib.timeout_add(self.seek_refresh, self.seek, step)
 
     def stop_seek(self):
@@ -163,17 +409,21 @@ class Player:
         GLib.source_remove(self._seeking_timeout)
         self._seeking_timeout = 0
 
-        if self.was_playing_before_seek:
+        if not self.stop_scrubbing(resume=self.was_playing_before_seek) and self.was_playing_before_seek:
             self.play_video()
 
         self._is_seeking = False
+        LOG.info('Seeks: {}'.format(self.seek_scheduler.get_stats()))
 
     def seek(self, step):
-        seek_pos = self.get_current_position() + step
+        # the longer the key is held, the larger the step
+        self._seek_ticks += 1
+        acceleration = min(self.max_seek_acceleration, 1 + self._seek_ticks // self.seek_acceleration_ticks)
+        seek_pos = self.get_current_position() + step * acceleration
 
         if 0 < seek_pos < self.video_length:
             self._is_seeking = True
-            self.video_player.set_time(int(seek_pos))
+            self.seek_scheduler.request(int(seek_pos))
             self.controller.signal_sender.emit('video_moving', self.get_current_position(), self.is_seeking())
 
         # always return True to make sure the event id is kept in glib
@@ -182,7 +432,7 @@ class Player:
     def go_to(self, time_ms):
         LOG.info('Go to {}ms (thread={})'.format(time_ms, threading.current_thread().getName()))
 
-        self.video_player.set_time(int(time_ms))
+        self.seek_scheduler.request(int(time_ms))
 
     def video_ended_handler(self, *args):
         GLib.idle_add(self.video_ended)
@@ -190,11 +440,49 @@ class Player:
     def video_ended(self):
         LOG.info('Video ended (thread={})'.format(threading.current_thread().getName()))
         self.video_player.stop()
+        self.seek_scheduler.reset()
+        self.clock.set_playing(False)
         self.controller.reload_current_video()
 
+    def set_low_latency_recording_playback(self, enabled):
+        LOG.info('Setting low latency recording playback to {}'.format(enabled))
+
+        if enabled and self.recording_player is None:
+            try:
+                self.recording_player = RecordingPlayer(
+                    cache_max_bytes=self.controller.get_setting('rec_cache_mb', 64) * 1024 * 1024,
+                    background_loader=self.controller.load_recording_now)
+            except Exception:
+                LOG.error('Could not create the low latency recording player, using VLC instead')
+                LOG.error(traceback.format_exc())
+                return False
+        elif not enabled and self.recording_player is not None:
+            self.recording_player.close()
+            self.recording_player = None
+
+        return True
+
+    def prefetch_recording(self, recording_path):
+        # this is called from the prefetcher thread, it must not touch vlc
+        recording_player = self.recording_player
+
+        if recording_player is not None:
+            return recording_player.cache.get(recording_path)
+
+        warm_file(recording_path)
+        return None
+
     def play_recording(self, recording_path):
         LOG.info('Playing recording at {} (thread={})'.format(recording_path, threading.current_thread().getName()))
 
+        if self.recording_player is not None:
+            try:
+                self.recording_player.play(recording_path, self.finished_playing_recording)
+                return
+            except Exception:
+                LOG.error('Could not play {} with the low latency player, using VLC instead'.format(recording_path))
+                LOG.error(traceback.format_exc())
+
         audio_media = self.vlc_instance.media_new_path(recording_path)
         self.rec_player.audio_set_mute(False)  # we need to this every time
         self.rec_player.set_mrl(audio_media.get_mrl())
@@ -210,7 +498,15 @@ class Player:
         LOG.info('Resetting (thread={})'.format(threading.current_thread().getName()))
 
         self.video_length = 0
+        self.video_metadata = None
+        self._load_id += 1
+        self._waiting_for_length = False
+        self._scrubbing = False
         self._seeking_timeout = 0
         self.was_playing_before_seek = None
         self._is_seeking = False
+        self._last_moving_position = None
+        self._seek_ticks = 0
+        self.seek_scheduler.reset()
+        self.clock.reset()
 
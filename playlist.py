@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import traceback
+
+from prefetch import warm_file
+from recordings import Recordings
+
+LOG = logging.getLogger('epic_narrator.playlist')
+
+VIDEO_EXTENSIONS = {'.mp4', '.m4v', '.mov', '.mkv', '.avi', '.webm', '.mpg', '.mpeg', '.mts', '.wmv', '.flv'}
+
+
+def find_videos(paths):
+    """Expands a list of videos and folders into a list of videos. Videos in a folder are sorted by name"""
+    videos = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if not name.startswith('.') and os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                    videos.append(os.path.join(path, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            LOG.error('Skipping {} from the playlist, it does not exist'.format(path))
+
+    return videos
+
+
+class Playlist:
+    def __init__(self, videos):
+        self.videos = list(videos)
+        self.index = 0
+
+    def get_current(self):
+        return self.videos[self.index]
+
+    def get_next(self):
+        return self.videos[self.index + 1] if self.has_next() else None
+
+    def has_next(self):
+        return self.index + 1 < len(self.videos)
+
+    def advance(self):
+        if self.has_next():
+            self.index += 1
+
+        return self.get_current()
+
+    def __len__(self):
+        return len(self.videos)
+
+
+class VideoPreparer:
+    """Probes, indexes and warms up the next video of a playlist in a background thread"""
+
+    def __init__(self, probe_function, warm_bytes=64 * 1024 * 1024):
+        self.probe_function = probe_function
+        self.warm_bytes = warm_bytes
+        self._lock = threading.Lock()
+        self._key = None
+        self._recordings = None
+        self._done = threading.Event()
+
+    def prepare(self, video_path, output_path):
+        key = (video_path, output_path)
+
+        with self._lock:
+            if key == self._key:
+                return
+
+            self._key = key
+            self._recordings = None
+            self._done = threading.Event()
+            done = self._done
+
+        LOG.info('Preparing {}'.format(video_path))
+        thread = threading.Thread(target=self._prepare, args=(key, done), name='video_preparer', daemon=True)
+        thread.start()
+
+    def take(self, video_path, output_path):
+        """Returns the recordings of the video if it was prepared, or None"""
+        with self._lock:
+            if self._key != (video_path, output_path) or not self._done.is_set():
+                return None
+
+            recordings = self._recordings
+            self._key = None
+            self._recordings = None
+
+        return recordings
+
+    def _prepare(self, key, done):
+        video_path, output_path = key
+
+        try:
+            warm_file(video_path, self.warm_bytes)
+            self.probe_function(video_path)
+            recordings = Recordings(output_path, video_path)
+
+            if recordings.narrations_exist():
+                recordings.load_narrations()
+        except Exception:
+            LOG.error('Could not prepare {}'.format(video_path))
+            LOG.error(traceback.format_exc())
+            return
+
+        with self._lock:
+            if self._key == key:
+                self._recordings = recordings
+                done.set()
+
+        LOG.info('{} is ready'.format(video_path))
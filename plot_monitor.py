@@ -0,0 +1,100 @@
+import logging
+import queue
+import sys
+
+import matplotlib as mpl
+
+mpl.use('PS')
+import matplotlib.pyplot as plt
+import gi
+import numpy as np
+
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+from matplotlib.animation import FuncAnimation
+from matplotlib.backends.backend_gtk3agg import (FigureCanvasGTK3Agg as FigureCanvas)
+
+from monitor_refresh import AdaptiveRefresh
+
+LOG = logging.getLogger('epic_narrator.plot_monitor')
+
+# matplotlib takes a while to import, so this module is only imported when the plot monitor is selected
+plt.switch_backend('MacOSX' if sys.platform.startswith('darwin') else 'GTK3Agg')
+
+
+class MicMonitor(FigureCanvas):
+    def __init__(self, controller, plot_interval_ms=30, idle_interval_ms=250):
+        # microphone monitor
+        self.controller = controller
+        self.fig, self.ax, self.lines, self.data = self.prepare_monitor_fig()
+        FigureCanvas.__init__(self, self.fig)  # a Gtk.DrawingArea
+        self.set_size_request(100, 50)
+        self.monitor_animation = FuncAnimation(self.fig, self.update_mic_monitor, interval=plot_interval_ms, blit=True)
+        self.is_recording = False
+        self._handler_id = self.controller.signal_sender.connect('recording_state_changed',
+                                                                 self.change_recording_state)
+        self.refresh = AdaptiveRefresh(self, self.set_refresh_interval, active_interval_ms=plot_interval_ms,
+                                       idle_interval_ms=idle_interval_ms)
+
+    def set_refresh_interval(self, interval_ms):
+        # the interval can change while the animation timer is running its callback, which would restart it twice
+        GLib.idle_add(self.apply_refresh_interval, interval_ms)
+
+    def apply_refresh_interval(self, interval_ms):
+        if interval_ms is None:
+            self.monitor_animation.event_source.stop()
+        else:
+            self.monitor_animation.event_source.interval = interval_ms
+            self.monitor_animation.event_source.start()
+
+        return False
+
+    def stop(self):
+        self.refresh.stop()
+        self.monitor_animation.event_source.stop()
+        self.controller.signal_sender.disconnect(self._handler_id)
+        plt.close(self.fig)
+
+    def prepare_monitor_fig(self):
+        plt.style.use('dark_background')
+        mpl.rcParams['toolbar'] = 'None'
+        fig, ax = plt.subplots()
+
+        window_length, n_channels = self.controller.get_recorder_window_size()
+        data = np.zeros((window_length, n_channels))
+        lines = ax.plot(data, color='w')
+        ax.axis((0, len(data), -0.25, 0.25))
+        ax.set_yticks([0])
+        ax.yaxis.grid(True)
+        fig.tight_layout(pad=-5)
+        ax.axis('off')
+        fig.canvas.set_window_title('Epic Narrator Monitor')
+
+        return fig, ax, lines, data
+
+    def update_mic_monitor(self, *args):
+        level = None
+
+        while True:
+            try:
+                data = self.controller.get_recorder_data()
+            except queue.Empty:
+                break
+
+            level = max(level or 0, float(np.abs(data).max()) if len(data) else 0)
+
+            shift = len(data)
+            self.data = np.roll(self.data, -shift, axis=0)
+            self.data[-shift:, :] = data
+
+        for column, line in enumerate(self.lines):
+            line.set_ydata(self.data[:, column])
+            color = 'red' if self.is_recording else 'white'
+            line.set_color(color)
+
+        self.refresh.data_received(level)
+        return self.lines
+
+    def change_recording_state(self, sender, state):
+        self.is_recording = state == 'recording'
+        self.refresh.set_recording(self.is_recording)
@@ -0,0 +1,136 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+
+LOG = logging.getLogger('epic_narrator.prefetch')
+
+
+def warm_file(path, max_bytes=None):
+    """Brings (the first max_bytes of) a file into the OS page cache"""
+    length = 0 if max_bytes is None else max_bytes
+
+    with open(path, 'rb') as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, length, os.POSIX_FADV_WILLNEED)
+            return
+
+        to_read = max_bytes
+
+        while to_read is None or to_read > 0:
+            chunk = f.read(1024 * 1024 if to_read is None else min(1024 * 1024, to_read))
+
+            if not chunk:
+                break
+
+            if to_read is not None:
+                to_read -= len(chunk)
+
+
+class RecordingPrefetcher:
+    """Loads the recordings the playhead is about to reach in a background thread"""
+
+    def __init__(self, load_function, n_ahead=5, horizon_ms=30000, budget_bytes=32 * 1024 * 1024,
+                 jump_threshold_ms=2000):
+        self.load_function = load_function
+        self.n_ahead = n_ahead
+        self.horizon_ms = horizon_ms
+        self.budget_bytes = budget_bytes
+        self.jump_threshold_ms = jump_threshold_ms
+        self.loaded = 0
+        self.cancelled = 0
+        self._generation = 0
+        self._requested = set()
+        self._last_position = None
+        self._queue = queue.PriorityQueue()  # (priority, order, generation, path, callback)
+        self._order = itertools.count()
+        self._thread = threading.Thread(target=self._run, name='recording_prefetcher', daemon=True)
+        self._thread.start()
+
+    def update(self, recordings, position_ms, rate=1):
+        # this is called constantly as the video plays, avoid logging
+        if self._last_position is not None and \
+                not 0 <= position_ms - self._last_position <= self.jump_threshold_ms * max(1, rate):
+            self.cancel()
+
+        self._last_position = position_ms
+        horizon = position_ms + self.horizon_ms * rate
+        budget = self.budget_bytes
+        window = set()
+
+        for rec_time in recordings.get_recordings_after(position_ms, self.n_ahead):
+            if rec_time > horizon:
+                break
+
+            size = recordings.get_recording_size(rec_time)
+
+            if size is None:
+                continue
+
+            budget -= size
+
+            if budget < 0:
+                break
+
+            path = recordings.get_path_for_recording(rec_time)
+            window.add(path)
+
+            if path not in self._requested:
+                self._requested.add(path)
+                self._queue.put((1, next(self._order), self._generation, path, None))
+
+        # forget what the playhead went past, so the set stays as small as the look-ahead window
+        self._requested &= window
+
+    def load_now(self, path, callback):
+        """Loads path before the queued recordings, then calls callback with the result or None"""
+        self._queue.put((0, next(self._order), None, path, callback))
+
+    def cancel(self):
+        self._generation += 1
+        self._requested.clear()
+        self._last_position = None
+        kept = []
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            # recordings requested with load_now are waited for, they are not cancelled
+            if item[4] is not None:
+                kept.append(item)
+            else:
+                self.cancelled += 1
+
+        for item in kept:
+            self._queue.put(item)
+
+    def stop(self):
+        LOG.info('Stopping prefetcher (loaded={}, cancelled={})'.format(self.loaded, self.cancelled))
+        self.cancel()
+        self._queue.put((2, next(self._order), None, None, None))
+
+    def _run(self):
+        while True:
+            _, _, generation, path, callback = self._queue.get()
+
+            if path is None:
+                break
+
+            if callback is None and generation != self._generation:
+                self.cancelled += 1
+                continue
+
+            result = None
+
+            try:
+                result = self.load_function(path)
+                self.loaded += 1
+            except Exception as e:
+                LOG.error('Could not prefetch {}: {}'.format(path, e))
+
+            if callback is not None:
+                callback(result)
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+LOG = logging.getLogger('epic_narrator.proxy')
+
+# Proxies are low resolution copies of the videos where every frame is a key frame, so seeking in them is cheap.
+# Frame timestamps are copied unchanged (including the start time of the video, which is not always zero), so a
+# time in the proxy is the same time in the original video.
+
+PART_SUFFIX = '.part.mp4'
+
+
+def get_proxy_path(proxy_folder, video_path):
+    stat = os.stat(video_path)
+    key = '{}|{}|{}'.format(os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    return os.path.join(proxy_folder, '{}.mp4'.format(hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]))
+
+
+def get_proxy_command(video_path, output_path, height=360):
+    ffmpeg = shutil.which('ffmpeg')
+
+    if ffmpeg is not None:
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-copyts', '-i', video_path, '-map', '0:v:0', '-an',
+                   '-vf', 'scale=-2:{}'.format(height), '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '1',
+                   '-vsync', 'passthrough', '-f', 'mp4', output_path]
+    else:
+        vlc = shutil.which('cvlc') or shutil.which('vlc')
+
+        if vlc is None:
+            return None
+
+        sout = '#transcode{{vcodec=h264,venc=x264{{keyint=1,preset=ultrafast}},height={},acodec=none}}:' \
+               'std{{access=file,mux=mp4,dst={}}}'.format(height, output_path)
+        command = [vlc, '-I', 'dummy', '--no-audio', '--no-sout-audio', video_path, '--sout', sout, 'vlc://quit']
+
+    # run the encoder with a low priority, it must not compete with the narrator
+    nice = shutil.which('nice')
+
+    return [nice, '-n', '15'] + command if nice is not None else command
+
+
+def get_start_time_ms(video_path):
+    """Start time of the first video stream as read by ffprobe, None if ffprobe is not installed or fails"""
+    ffprobe = shutil.which('ffprobe')
+
+    if ffprobe is None:
+        return None
+
+    command = [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=start_time',
+               '-of', 'default=noprint_wrappers=1:nokey=1', video_path]
+
+    try:
+        output = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=30).stdout
+        return 1000 * float(output.decode('utf-8').strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def remove_old_proxies(proxy_folder, max_bytes, max_age_days, keep=()):
+    """Removes proxies unused for max_age_days, then the least recently used past max_bytes"""
+    proxies = []
+    removed = []
+    now = time.time()
+
+    for name in os.listdir(proxy_folder):
+        path = os.path.join(proxy_folder, name)
+
+        if path in keep:
+            continue
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+
+        if name.endswith(PART_SUFFIX) or now - stat.st_mtime > max_age_days * 24 * 3600:
+            removed.append(path)
+        elif name.endswith('.mp4'):
+            proxies.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in proxies)
+
+    for _, size, path in sorted(proxies):
+        if total <= max_bytes:
+            break
+
+        removed.append(path)
+        total -= size
+
+    for path in removed:
+        try:
+            os.remove(path)
+            LOG.info('Removed proxy {}'.format(path))
+        except OSError as e:
+            LOG.error('Could not remove proxy {}: {}'.format(path, e))
+
+    return removed
+
+
+class ProxyBuilder:
+    """Builds proxies one at a time with ffmpeg (or vlc) in a background process"""
+
+    def __init__(self, proxy_folder, probe_function, height=360, max_duration_error_ms=100,
+                 max_start_time_error_ms=50, max_bytes=4 * 1024 * 1024 * 1024, max_age_days=30):
+        self.proxy_folder = proxy_folder
+        self.probe_function = probe_function
+        self.height = height
+        self.max_duration_error_ms = max_duration_error_ms
+        self.max_start_time_error_ms = max_start_time_error_ms
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._process = None
+        self._building = None
+        self._lock = threading.Lock()
+        os.makedirs(self.proxy_folder, exist_ok=True)
+        threading.Thread(target=self._remove_old, name='proxy_cleanup', daemon=True).start()
+
+    def request(self, video_path, duration_ms, ready_callback):
+        proxy_path = get_proxy_path(self.proxy_folder, video_path)
+
+        if os.path.exists(proxy_path):
+            self._touch(proxy_path)
+            GLib.idle_add(ready_callback, video_path, proxy_path)
+            return
+
+        self.cancel()
+        thread = threading.Thread(target=self._build, args=(video_path, duration_ms, proxy_path, ready_callback),
+                                  name='proxy_builder', daemon=True)
+        thread.start()
+
+    def cancel(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                LOG.info('Cancelling proxy generation')
+                self._process.terminate()
+
+    def _remove_old(self, keep=()):
+        with self._lock:
+            keep = set(keep) | ({self._building} if self._building is not None else set())
+
+        try:
+            remove_old_proxies(self.proxy_folder, self.max_bytes, self.max_age_days, keep=keep)
+        except OSError as e:
+            LOG.error('Could not clean up proxies in {}: {}'.format(self.proxy_folder, e))
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _build(self, video_path, duration_ms, proxy_path, ready_callback):
+        tmp_path = proxy_path + PART_SUFFIX
+        command = get_proxy_command(video_path, tmp_path, height=self.height)
+
+        if command is None:
+            LOG.error('Cannot build proxies: neither ffmpeg nor vlc could be found')
+            return
+
+        LOG.info('Building proxy of {}: {}'.format(video_path, command))
+
+        with self._lock:
+            self._building = tmp_path
+            self._process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                             stderr=subprocess.PIPE)
+            process = self._process
+
+        _, stderr = process.communicate()
+
+        with self._lock:
+            if self._building == tmp_path:
+                self._building = None
+
+        if process.returncode != 0 or not os.path.exists(tmp_path):
+            LOG.error('Could not build proxy of {} (return code {}): {}'.format(
+                video_path, process.returncode, stderr.decode('utf-8', errors='replace')))
+            self._remove(tmp_path)
+            return
+
+        metadata = self.probe_function(tmp_path)
+
+        if metadata is None or abs(metadata['duration_ms'] - duration_ms) > self.max_duration_error_ms:
+            LOG.error('Discarding proxy of {}, its duration does not match the video ({} vs {}ms)'.format(
+                video_path, None if metadata is None else metadata['duration_ms'], duration_ms))
+            self._remove(tmp_path)
+            return
+
+        # a shifted start would put every frame of the proxy at the wrong time
+        video_start_ms = get_start_time_ms(video_path)
+        proxy_start_ms = get_start_time_ms(tmp_path)
+
+        if video_start_ms is not None and (proxy_start_ms is None or
+                                           abs(proxy_start_ms - video_start_ms) > self.max_start_time_error_ms):
+            LOG.error('Discarding proxy of {}, its start time does not match the video ({} vs {}ms)'.format(
+                video_path, proxy_start_ms, video_start_ms))
+            self._remove(tmp_path)
+            return
+
+        os.replace(tmp_path, proxy_path)
+        LOG.info('Proxy of {} ready: {}'.format(video_path, proxy_path))
+        GLib.idle_add(ready_callback, video_path, proxy_path)
+        self._remove_old(keep=[proxy_path])
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
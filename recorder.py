@@ -1,17 +1,23 @@
 import logging
+import os
 
 import sounddevice as sd
 import queue
 import soundfile as sf
 
+from durable import DirectoryFlusher, get_temporary_path
+
 LOG = logging.getLogger('epic_narrator.recorder')
 
 
 class Recorder:
-    def __init__(self, channels=[1], device_id=sd.default.device[0], window=200, downsample=10):
+    def __init__(self, channels=[1], device_id=None, window=200, downsample=10, max_queued_blocks=100):
+        if device_id is None:
+            device_id = self.get_default_device()  # read now, --set-audio-device may have changed it
+
         LOG.info("Creating recorder for device id {}".format(device_id))
         self.mapping = [c - 1 for c in channels]  # Channel numbers start with 1
-        self.q = queue.Queue()
+        self.q = queue.Queue(maxsize=max_queued_blocks)  # the monitor does not read it while hidden
         self.channels = channels
         self.device_info = dict()
         self.device_id = device_id
@@ -20,9 +26,15 @@ class Recorder:
         self.length = int(self.window * self.sample_rate / (1000 * self.downsample))
         self.is_recording = False
         self.current_file = None
+        self.current_path = None
+        self.flusher = DirectoryFlusher()
 
-        self.stream = sd.InputStream(device=self.device_id, channels=max(self.channels),
-                                     samplerate=self.sample_rate, callback=self.audio_callback)
+        try:
+            self.stream = sd.InputStream(device=self.device_id, channels=max(self.channels),
+                                         samplerate=self.sample_rate, callback=self.audio_callback)
+        except Exception:
+            self.flusher.stop()
+            raise
 
     @property
     def device_id(self):
@@ -49,25 +61,42 @@ class Recorder:
             self.stop_recording()  # this will wait for any open files to be closed
 
         self.stream.close(ignore_errors=True)
+        self.flusher.flush()
         LOG.info('Stream closed')
 
     def start_recording(self, filename):
+        # we record to a temporary file, so overwritten recordings are kept until the new one is complete
         LOG.info("Starting new recording, saving to {}".format(filename))
+        self.current_path = filename
         self.is_recording = True
-        self.current_file = sf.SoundFile(filename, mode='w', samplerate=int(self.sample_rate),
-                                         channels=len(self.channels))
+        audio_format = os.path.splitext(filename)[1][1:]
+        self.current_file = sf.SoundFile(get_temporary_path(filename), mode='w', samplerate=int(self.sample_rate),
+                                         channels=len(self.channels), format=audio_format)
 
     def stop_recording(self):
-        LOG.info("Stopping recording, saved to {}".format(self.current_file.name))
+        LOG.info("Stopping recording, saved to {}".format(self.current_path))
         self.is_recording = False
         LOG.debug("Closing {}".format(self.current_file.name))
         self.current_file.close()
 
+        try:
+            os.replace(self.current_file.name, self.current_path)
+        except OSError as e:
+            LOG.error('Could not move {} to {}: {}'.format(self.current_file.name, self.current_path, e))
+            return
+
+        # the recording is moved in place right away, so it can be played and scanned, and it is synced in the
+        # background: the file at once, the folder (which makes the rename durable) batched with other renames
+        self.flusher.schedule(os.path.dirname(self.current_path), self.current_path)
+
     def audio_callback(self, indata, frames, time, status):
         """This is called (from a separate thread) for each audio block."""
 
         # Fancy indexing with mapping creates a (necessary!) copy:
-        self.q.put(indata[::self.downsample, self.mapping])
+        try:
+            self.q.put_nowait(indata[::self.downsample, self.mapping])
+        except queue.Full:
+            pass  # nobody is reading the queue, e.g. the monitor is hidden
 
         if self.current_file is None or self.current_file.closed:
             return
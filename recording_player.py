@@ -0,0 +1,103 @@
+import logging
+import threading
+
+import sounddevice as sd
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+from pcm import PcmCache
+
+LOG = logging.getLogger('epic_narrator.recording_player')
+
+
+class RecordingPlayer:
+    """Plays recordings through an output stream that is always open"""
+
+    def __init__(self, cache_max_bytes=64 * 1024 * 1024, block_size=256, background_loader=None):
+        device_info = sd.query_devices(kind='output')
+        self.sample_rate = int(device_info['default_samplerate'])
+        self.cache = PcmCache(max_bytes=cache_max_bytes, sample_rate=self.sample_rate)
+        self._lock = threading.Lock()
+        self._playing = None  # (samples, finished_callback)
+        self._position = 0
+        self._loading = None  # (recording_path, finished_callback) waiting for background_loader
+        # decodes uncached recordings away from the main thread: background_loader(path, callback(result or None))
+        self.background_loader = background_loader
+
+        LOG.info('Opening output stream at {}Hz (device={})'.format(self.sample_rate, device_info['name']))
+        self.stream = sd.OutputStream(samplerate=self.sample_rate, channels=1, dtype='float32',
+                                      blocksize=block_size, latency='low', callback=self._audio_callback)
+        self.stream.start()
+
+    def play(self, recording_path, finished_callback):
+        cached = self.cache.get_cached(recording_path)
+
+        if cached is None and self.background_loader is not None:
+            self.stop()
+            self._loading = (recording_path, finished_callback)
+            self.background_loader(recording_path,
+                                   lambda result: GLib.idle_add(self._play_loaded, recording_path, result))
+            return
+
+        samples, _ = cached if cached is not None else self.cache.get(recording_path)
+        self._start(samples, finished_callback)
+
+    def _play_loaded(self, recording_path, result):
+        if self._loading is None or self._loading[0] != recording_path:
+            return False  # stopped or replaced by another recording meanwhile
+
+        _, finished_callback = self._loading
+        self._loading = None
+
+        if result is None:
+            LOG.error('Could not load {}'.format(recording_path))
+            finished_callback()
+        else:
+            self._start(result[0], finished_callback)
+
+        return False
+
+    def _start(self, samples, finished_callback):
+        with self._lock:
+            interrupted = self._playing
+            self._playing = (samples, finished_callback)
+            self._position = 0
+
+        if interrupted is not None:
+            GLib.idle_add(interrupted[1])
+
+    def is_playing(self):
+        return self._playing is not None or self._loading is not None
+
+    def stop(self):
+        with self._lock:
+            interrupted, self._playing = self._playing, None
+
+        loading, self._loading = self._loading, None
+
+        for stopped in (interrupted, loading):
+            if stopped is not None:
+                GLib.idle_add(stopped[1])
+
+    def close(self):
+        LOG.info('Closing output stream (cache hits={}, misses={})'.format(self.cache.hits, self.cache.misses))
+        self.stop()
+        self.stream.close(ignore_errors=True)
+
+    def _audio_callback(self, outdata, frames, time, status):
+        """This is called (from a separate thread) for each audio block."""
+        with self._lock:
+            if self._playing is None:
+                outdata.fill(0)
+                return
+
+            samples, finished_callback = self._playing
+            n = min(frames, len(samples) - self._position)
+            outdata[:n, 0] = samples[self._position:self._position + n]
+            outdata[n:] = 0
+            self._position += n
+
+            if self._position >= len(samples):
+                self._playing = None
+                GLib.idle_add(finished_callback)
@@ -17,6 +17,7 @@ class Recordings:
         self.audio_extension = audio_extension
         self._recordings = {}
         self._recording_times = []
+        self._sizes = {}  # time -> file size in bytes, read when first needed
         self._highlighted_rec_index = None
         os.makedirs(self.video_narrations_folder, exist_ok=True)
 
@@ -24,6 +25,7 @@ class Recordings:
         LOG.info("Adding recording at {!r} (overwrite={})".format(time, overwrite))
         os.makedirs(self.video_narrations_folder, exist_ok=True)
         path = os.path.join(self.video_narrations_folder, '{}.{}'.format(time, self.audio_extension))
+        self.forget_size(time)
 
         if not overwrite:
             self._recordings[time] = path
@@ -40,10 +42,13 @@ class Recordings:
     def delete_recording(self, time):
         if time in self._recordings:
             LOG.info("Deleting recording at {!r}".format(time))
+            from peaks import remove_peaks  # imports numpy and soundfile, not needed before the window is shown
             filepath = self._recordings[time]
             os.remove(filepath)
+            remove_peaks(filepath)
             LOG.info("Deleted recording {}".format(filepath))
             del self._recordings[time]
+            self.forget_size(time)
             self._recording_times.remove(time)  # no need to sort when we delete
 
     def delete_last(self):
@@ -51,10 +56,25 @@ class Recordings:
 
     def scan_folder(self):
         LOG.info("Scanning {} for audio files".format(self.video_narrations_folder))
+        self.recover_unfinished_recordings()
         audio_files = glob.glob(os.path.join(self.video_narrations_folder, '*.{}'.format(self.audio_extension)))
         LOG.info("Found {} existing recordings".format(len(audio_files)))
         return audio_files
 
+    def recover_unfinished_recordings(self):
+        # recordings cut off by a crash are left as temporary files, we repair them and put them in place
+        from wav_repair import get_quarantine_folder, recover_unfinished_recordings
+        quarantine_folder = get_quarantine_folder(self.base_folder, self.video_narrations_folder)
+        results = recover_unfinished_recordings(self.video_narrations_folder, quarantine_folder,
+                                                audio_extension=self.audio_extension)
+
+        for path, result in results.items():
+            if result['status'] == 'recovered':
+                LOG.warning("Recovered unfinished recording {}".format(result['path']))
+            else:
+                LOG.warning("Could not recover unfinished recording {}, moved it to {} ({})".format(
+                    path, result['path'], result['reason']))
+
     def narrations_exist(self):
         return os.path.exists(self.video_narrations_folder) and len(self.scan_folder()) > 0
 
@@ -71,9 +91,31 @@ class Recordings:
         else:
             return None
 
+    def get_recording_size(self, time_ms):
+        """Size in bytes of the recording file, None if it cannot be read (e.g. it is still being recorded)"""
+        if time_ms not in self._sizes:
+            try:
+                self._sizes[time_ms] = os.path.getsize(self._recordings[time_ms])
+            except (KeyError, OSError):
+                return None
+
+        return self._sizes[time_ms]
+
+    def forget_size(self, time_ms):
+        # the file was written again, e.g. when a recording is overwritten
+        self._sizes.pop(time_ms, None)
+
     def get_recordings_times(self):
         return self._recording_times
 
+    def get_recordings_paths(self):
+        return [self._recordings[t] for t in self._recording_times]
+
+    def get_recordings_after(self, time_ms, n):
+        # recordings at or after time_ms, in timestamp order
+        pos = bisect.bisect_left(self._recording_times, time_ms)
+        return self._recording_times[pos:pos + n]
+
     def get_last_recording_time(self):
         return self._recording_times[-1]
 
@@ -0,0 +1,113 @@
+import logging
+import queue
+import threading
+
+import numpy as np
+import sounddevice as sd
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+from pcm import load_pcm
+
+LOG = logging.getLogger('epic_narrator.review')
+
+
+class ReviewStream:
+    """Plays a list of recordings back to back through a single output stream"""
+
+    def __init__(self, recordings, recording_started_callback, finished_callback, read_ahead=8, gap_ms=0,
+                 block_size=1024):
+        self.recordings = recordings  # list of (time_ms, path) in playback order
+        self.recording_started_callback = recording_started_callback
+        self.finished_callback = finished_callback
+        self.gap_ms = gap_ms
+        self.block_size = block_size
+        self.underruns = 0
+        self._queue = queue.Queue(maxsize=read_ahead)
+        self._stop_event = threading.Event()
+        self._reader_done = threading.Event()
+        self._current = None
+        self._current_pos = 0
+        self._reader = None
+        self.stream = None
+        self.sample_rate = None
+
+    def start(self):
+        first_time, first_path = self.recordings[0]
+        first_samples, self.sample_rate = load_pcm(first_path)
+        LOG.info('Starting review of {} recordings at {}Hz'.format(len(self.recordings), self.sample_rate))
+        self._queue.put((first_time, self._with_gap(first_samples)))
+
+        self._reader = threading.Thread(target=self._read_recordings, name='review_reader', daemon=True)
+        self._reader.start()
+
+        self.stream = sd.OutputStream(samplerate=self.sample_rate, channels=1, dtype='float32',
+                                      blocksize=self.block_size, callback=self._audio_callback,
+                                      finished_callback=self._stream_finished)
+        self.stream.start()
+
+    def stop(self):
+        LOG.info('Stopping review (underruns={})'.format(self.underruns))
+        self._stop_event.set()
+
+        if self.stream is not None:
+            self.stream.abort(ignore_errors=True)
+            self.stream.close(ignore_errors=True)
+
+    def _with_gap(self, samples):
+        if self.gap_ms <= 0:
+            return samples
+
+        return np.concatenate((samples, np.zeros(int(self.sample_rate * self.gap_ms / 1000), dtype=np.float32)))
+
+    def _read_recordings(self):
+        for time_ms, path in self.recordings[1:]:
+            try:
+                samples, _ = load_pcm(path, sample_rate=self.sample_rate)
+            except Exception as e:
+                LOG.error('Could not read {}, skipping it: {}'.format(path, e))
+                continue
+
+            item = (time_ms, self._with_gap(samples))
+
+            while not self._stop_event.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+            if self._stop_event.is_set():
+                return
+
+        self._reader_done.set()
+
+    def _audio_callback(self, outdata, frames, time, status):
+        """This is called (from a separate thread) for each audio block."""
+        written = 0
+
+        while written < frames:
+            if self._current is None or self._current_pos >= len(self._current):
+                try:
+                    time_ms, self._current = self._queue.get_nowait()
+                except queue.Empty:
+                    outdata[written:, 0] = 0
+
+                    if self._reader_done.is_set():
+                        raise sd.CallbackStop
+
+                    self.underruns += 1
+                    return
+
+                self._current_pos = 0
+                GLib.idle_add(self.recording_started_callback, time_ms)
+
+            n = min(frames - written, len(self._current) - self._current_pos)
+            outdata[written:written + n, 0] = self._current[self._current_pos:self._current_pos + n]
+            self._current_pos += n
+            written += n
+
+    def _stream_finished(self):
+        if not self._stop_event.is_set():
+            GLib.idle_add(self.finished_callback)
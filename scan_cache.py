@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import sqlite3
+
+LOG = logging.getLogger('epic_narrator.scan_cache')
+
+SCAN_CACHE_FILENAME = '.epic_narrator_scan_cache.sqlite'
+QUARANTINE_FOLDER = 'epic_narrator_quarantine'  # next to the epic_narrator_recordings folder
+
+
+def find_recordings(root, audio_extension='wav', include_unfinished=False):
+    """Yields (path, size, mtime_ns) for the recordings under root, skipping hidden folders"""
+    suffix = '.{}'.format(audio_extension)
+    unfinished_suffix = '.{}.part'.format(audio_extension)
+    folders = [root]
+
+    while folders:
+        folder = folders.pop()
+
+        try:
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            LOG.error('Cannot scan {}: {}'.format(folder, e))
+            continue
+
+        for entry in entries:
+            if include_unfinished and entry.name.startswith('.') and entry.name.endswith(unfinished_suffix) and \
+                    entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime_ns
+                continue
+
+            if entry.name.startswith('.'):
+                continue
+
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(entry.path)
+            elif entry.name.endswith(suffix):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime_ns
+
+
+class ScanCache:
+    """Per-file analysis results, valid while the size and mtime of the file do not change"""
+
+    def __init__(self, root, analysis):
+        self.root = os.path.abspath(root)
+        self.analysis = analysis
+        self.path = os.path.join(self.root, SCAN_CACHE_FILENAME)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (analysis TEXT, path TEXT, size INTEGER, '
+                         'mtime_ns INTEGER, result TEXT, PRIMARY KEY (analysis, path))')
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def load(self):
+        """Returns a dict {relative path: (size, mtime_ns, result)} with all the cached results"""
+        rows = self._db.execute('SELECT path, size, mtime_ns, result FROM results WHERE analysis = ?',
+                                (self.analysis,))
+        return {path: (size, mtime_ns, json.loads(result)) for path, size, mtime_ns, result in rows}
+
+    def split(self, files):
+        """Splits the (path, size, mtime_ns) tuples in files into cached results and files to be analysed"""
+        cached_entries = self.load()
+        cached = {}
+        stale = []
+
+        for path, size, mtime_ns in files:
+            entry = cached_entries.get(self._relative(path))
+
+            if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+                cached[path] = entry[2]
+            else:
+                stale.append((path, size, mtime_ns))
+
+        return cached, stale
+
+    def put_many(self, results):
+        """Stores the results given as (path, size, mtime_ns, result) tuples"""
+        self._db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                             ((self.analysis, self._relative(path), size, mtime_ns, json.dumps(result))
+                              for path, size, mtime_ns, result in results))
+        self._db.commit()
+
+    def remove(self, paths):
+        self._db.executemany('DELETE FROM results WHERE analysis = ? AND path = ?',
+                             ((self.analysis, self._relative(p)) for p in paths))
+        self._db.commit()
+
+    def prune(self, existing_paths):
+        existing = {self._relative(p) for p in existing_paths}
+        missing = [p for p in self.load() if p not in existing]
+
+        if missing:
+            LOG.info('Pruning {} cached {} results of missing files'.format(len(missing), self.analysis))
+            self.remove(os.path.join(self.root, p) for p in missing)
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,106 @@
+import logging
+import time
+from collections import deque
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+LOG = logging.getLogger('epic_narrator.seek_scheduler')
+
+
+class SeekScheduler:
+    """Sends one seek at a time, keeping only the newest target while a seek is in flight"""
+
+    def __init__(self, seek_function, landing_tolerance_ms=150, landing_timeout_ms=500, latency_window=500):
+        self.seek_function = seek_function
+        self.landing_tolerance_ms = landing_tolerance_ms  # well below the seek step, or stale positions look landed
+        self.landing_timeout_ms = landing_timeout_ms
+        self.latencies = deque(maxlen=latency_window)
+        self.issued = 0
+        self.superseded = 0
+        self.timeouts = 0
+        self._in_flight = None  # (target_ms, issue time)
+        self._pending = None
+        self._timeout_id = 0
+
+    def request(self, target_ms):
+        if self._in_flight is None:
+            self._issue(target_ms)
+        else:
+            if self._pending is not None:
+                self.superseded += 1
+
+            self._pending = target_ms
+
+    def get_target(self):
+        """Returns the newest target that has not landed yet, or None"""
+        if self._pending is not None:
+            return self._pending
+        elif self._in_flight is not None:
+            return self._in_flight[0]
+        else:
+            return None
+
+    def is_busy(self):
+        return self._in_flight is not None
+
+    def position_changed(self, position_ms, received_at=None):
+        """received_at is the time.monotonic() when the player event arrived, if known"""
+        if self._in_flight is None:
+            return
+
+        target_ms, issued_at = self._in_flight
+
+        if received_at is not None and received_at < issued_at:
+            return  # an event sent before the seek, still waiting in the main loop
+
+        if abs(position_ms - target_ms) > self.landing_tolerance_ms:
+            return  # the player has not got there yet
+
+        self.latencies.append(1000 * (time.monotonic() - issued_at))
+        self._landed()
+
+    def reset(self):
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+
+        self._timeout_id = 0
+        self._in_flight = None
+        self._pending = None
+
+    def get_stats(self):
+        latencies = sorted(self.latencies)
+        stats = {'issued': self.issued, 'superseded': self.superseded, 'timeouts': self.timeouts}
+
+        if latencies:
+            stats.update(mean_ms=round(sum(latencies) / len(latencies), 1),
+                         p95_ms=round(latencies[int(0.95 * (len(latencies) - 1))], 1),
+                         max_ms=round(latencies[-1], 1))
+
+        return stats
+
+    def _issue(self, target_ms):
+        self.issued += 1
+        self._in_flight = (target_ms, time.monotonic())
+        self.seek_function(int(target_ms))
+        self._timeout_id = GLib.timeout_add(self.landing_timeout_ms, self._landing_timed_out)
+
+    def _landed(self):
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+
+        self._timeout_id = 0
+        self._in_flight = None
+
+        if self._pending is not None:
+            target_ms, self._pending = self._pending, None
+            self._issue(target_ms)
+
+    def _landing_timed_out(self):
+        # the player did not tell us the seek landed, don't hold the next seeks forever
+        self.timeouts += 1
+        self._timeout_id = 0
+        self._landed()
+
+        return False
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LOG = logging.getLogger('epic_narrator.startup')
+
+
+class StartupTasks:
+    """Runs the independent startup steps on a thread pool while the window is built"""
+
+    def __init__(self, started=None, max_workers=4):
+        self.started = started if started is not None else time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='startup')
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._timeline = []  # (ms since started, event)
+        self._finished = False
+
+    def _since_started(self):
+        return 1000 * (time.perf_counter() - self.started)
+
+    def mark(self, event):
+        with self._lock:
+            self._timeline.append((self._since_started(), event))
+
+    def submit(self, name, function, *args, **kwargs):
+        def run():
+            start_ms = self._since_started()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.mark('{} ran in {} ({:.0f}ms from {:.0f}ms)'.format(
+                    name, threading.current_thread().name, self._since_started() - start_ms, start_ms))
+
+        with self._lock:
+            self._futures[name] = self._executor.submit(run)
+
+    def has(self, name):
+        with self._lock:
+            return name in self._futures
+
+    def result(self, name):
+        """Waits for a task and returns its result, raising what the task raised"""
+        with self._lock:
+            future = self._futures[name]
+
+        if not future.done():
+            start_ms = self._since_started()
+            future.exception()  # waits
+            self.mark('{} waited {:.0f}ms for {}'.format(threading.current_thread().name,
+                                                         self._since_started() - start_ms, name))
+
+        return future.result()
+
+    def pop(self, name):
+        """Like result, but forgets the task, so the result is used only once. Returns None if there is no task"""
+        if not self.has(name):
+            return None
+
+        result = self.result(name)
+
+        with self._lock:
+            self._futures.pop(name, None)
+
+        return result
+
+    def finish(self):
+        """Logs the startup timeline and lets the pool threads exit"""
+        if self._finished:
+            return
+
+        self._finished = True
+        self.mark('startup finished')
+        self._executor.shutdown(wait=False)
+
+        with self._lock:
+            timeline = sorted(self._timeline)
+
+        LOG.info('Startup timeline:\n{}'.format('\n'.join('{:>8.0f}ms {}'.format(t, event)
+                                                           for t, event in timeline)))
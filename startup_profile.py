@@ -0,0 +1,121 @@
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+
+LOG = logging.getLogger('epic_narrator.startup_profile')
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, name, profiler):
+        self.loader = loader
+        self.name = name
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.profiler.start(self.name)
+
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler.finish(self.name)
+
+    def __getattr__(self, name):
+        # get_data, get_resource_reader and the like go to the real loader
+        return getattr(self.loader, name)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """Times the imports made while it is installed, like python -X importtime"""
+
+    def __init__(self):
+        self.records = []  # (name, self_us, cumulative_us, depth, thread name)
+        self._local = threading.local()  # .stack: [name, start, time spent in nested imports]
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # ask the other finders, then wrap the loader they found
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+
+        spec.loader = _TimedLoader(spec.loader, fullname, self)
+        return spec
+
+    def _get_stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+
+        return self._local.stack
+
+    def start(self, name):
+        self._get_stack().append([name, time.perf_counter(), 0])
+
+    def finish(self, name):
+        stack = self._get_stack()
+        _, start, nested = stack.pop()
+        cumulative = time.perf_counter() - start
+
+        if stack:
+            stack[-1][2] += cumulative
+
+        # list.append is atomic, records from several threads can be added without a lock
+        self.records.append((name, int(1e6 * (cumulative - nested)), int(1e6 * cumulative), len(stack),
+                             threading.current_thread().name))
+
+    def get_total_ms(self):
+        """Sum over all threads, so parallel imports are counted as many times"""
+        return sum(cumulative for _, _, cumulative, depth, _ in self.records if depth == 0) / 1000
+
+    def get_report(self, min_cumulative_us=0):
+        lines = ['import time: self [us] | cumulative | {:<16} | imported package'.format('thread')]
+
+        for name, self_us, cumulative_us, depth, thread_name in self.records:
+            if cumulative_us >= min_cumulative_us:
+                lines.append('import time: {:>9} | {:>10} | {:<16} | {}{}'.format(self_us, cumulative_us, thread_name,
+                                                                                 '  ' * depth, name))
+
+        return '\n'.join(lines)
+
+
+def log_time_to_window(window, started, profiler=None, startup_tasks=None):
+    """Logs the time until the window is first drawn, and the import report if profiling"""
+
+    def first_drawn(widget, cairo_ctx):
+        widget.disconnect(handler_id)
+        time_to_window = 'Time to window: {:.0f}ms'.format(1000 * (time.perf_counter() - started))
+        LOG.info(time_to_window)
+
+        if startup_tasks is not None:
+            startup_tasks.mark('window drawn')
+
+        if profiler is not None:
+            profiler.uninstall()
+            report = profiler.get_report()
+            LOG.info('Modules imported before the window was shown ({:.0f}ms):\n{}'.format(profiler.get_total_ms(),
+                                                                                         report))
+            print('{}\n{}'.format(report, time_to_window), file=sys.stderr)
+
+        return False
+
+    handler_id = window.connect_after('draw', first_drawn)
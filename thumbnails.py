@@ -0,0 +1,181 @@
+import ctypes
+import logging
+import os
+import queue
+import threading
+
+import numpy as np
+import vlc
+import gi
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import GdkPixbuf, GLib
+
+from durable import get_temporary_path
+
+LOG = logging.getLogger('epic_narrator.thumbnails')
+
+THUMBNAILS_FOLDER = '.thumbnails'
+
+
+def get_thumbnails_folder(narrations_folder):
+    return os.path.join(narrations_folder, THUMBNAILS_FOLDER)
+
+
+def get_thumbnail_path(narrations_folder, time_ms):
+    return os.path.join(get_thumbnails_folder(narrations_folder), '{}.jpg'.format(time_ms))
+
+
+def get_thumbnail_size(video_metadata, width=160):
+    if video_metadata is None or not video_metadata.get('width') or not video_metadata.get('height'):
+        return width, width * 9 // 16
+
+    height = round(width * video_metadata['height'] / video_metadata['width'])
+    return width, height + height % 2
+
+
+class ThumbnailExtractor:
+    """Saves small frames of the video at the narration timestamps, decoded by an offscreen vlc"""
+
+    def __init__(self, narrations_folder, video_path, size=(160, 90), frame_timeout_ms=5000):
+        self.narrations_folder = narrations_folder
+        self.video_path = video_path
+        self.width, self.height = size
+        self.frame_timeout_ms = frame_timeout_ms
+        self.extracted = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._buffer = ctypes.create_string_buffer(self.width * self.height * 4)
+        self._buffer_lock = threading.Lock()  # held by vlc while it writes a frame in the buffer
+        self._frame = None  # copy of the last frame written
+        self._frame_ready = threading.Event()
+
+        os.makedirs(get_thumbnails_folder(narrations_folder), exist_ok=True)
+
+        # keep references to the callbacks, otherwise they are garbage collected while vlc uses them
+        self._lock_callback = vlc.CallbackDecorators.VideoLockCb(self._lock_frame)
+        self._unlock_callback = vlc.CallbackDecorators.VideoUnlockCb(self._unlock_frame)
+        self._display_callback = vlc.CallbackDecorators.VideoDisplayCb(self._display_frame)
+
+        self._thread = threading.Thread(target=self._run, name='thumbnail_extractor', daemon=True)
+        self._thread.start()
+
+    def get_thumbnail(self, time_ms):
+        """Returns the path of the thumbnail for a timestamp, or None if it has not been extracted yet"""
+        path = get_thumbnail_path(self.narrations_folder, time_ms)
+        return path if os.path.exists(path) else None
+
+    def submit(self, time_ms, force=False):
+        with self._lock:
+            if time_ms in self._queued:
+                return
+
+            if not force and os.path.exists(get_thumbnail_path(self.narrations_folder, time_ms)):
+                return
+
+            self._queued.add(time_ms)
+
+        self._queue.put(time_ms)
+
+    def submit_missing(self, times_ms):
+        for time_ms in times_ms:
+            self.submit(time_ms)
+
+    def remove(self, time_ms):
+        with self._lock:
+            self._queued.discard(time_ms)
+
+        try:
+            os.remove(get_thumbnail_path(self.narrations_folder, time_ms))
+        except FileNotFoundError:
+            pass
+
+    def stop(self):
+        LOG.info('Stopping thumbnail extractor (extracted={}, failed={})'.format(self.extracted, self.failed))
+
+        with self._lock:
+            self._queued.clear()
+
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+        self._queue.put(None)
+
+    def _lock_frame(self, opaque, planes):
+        self._buffer_lock.acquire()
+        planes[0] = ctypes.cast(self._buffer, ctypes.c_void_p)
+        return None
+
+    def _unlock_frame(self, opaque, picture, planes):
+        self._buffer_lock.release()
+
+    def _display_frame(self, opaque, picture):
+        # vlc may decode the next frame while we save this one, so we keep a copy
+        with self._buffer_lock:
+            self._frame = self._buffer.raw
+
+        self._frame_ready.set()
+
+    def _run(self):
+        instance = vlc.Instance('--no-xlib', '--no-audio', '--quiet')
+        player = instance.media_player_new()
+        player.video_set_callbacks(self._lock_callback, self._unlock_callback, self._display_callback, None)
+        player.video_set_format('RV32', self.width, self.height, self.width * 4)
+
+        while True:
+            time_ms = self._queue.get()
+
+            if time_ms is None:
+                break
+
+            with self._lock:
+                if time_ms not in self._queued:
+                    continue  # removed while it was waiting
+
+            try:
+                self._extract(instance, player, time_ms)
+            except Exception as e:
+                self.failed += 1
+                LOG.error('Could not extract thumbnail at {}ms: {}'.format(time_ms, e))
+
+            with self._lock:
+                self._queued.discard(time_ms)
+
+        player.stop()
+        player.release()
+        instance.release()
+
+    def _extract(self, instance, player, time_ms):
+        media = instance.media_new_path(self.video_path)
+        media.add_option(':start-time={:.3f}'.format(time_ms / 1000))
+        media.add_option(':start-paused')
+        self._frame_ready.clear()
+        player.set_media(media)
+        player.play()
+        got_frame = self._frame_ready.wait(self.frame_timeout_ms / 1000)
+
+        if got_frame:
+            self._save(time_ms)
+        else:
+            self.failed += 1
+            LOG.error('No frame decoded at {}ms within {}ms'.format(time_ms, self.frame_timeout_ms))
+
+        player.stop()
+        media.release()
+
+    def _save(self, time_ms):
+        # RV32 frames are BGRA in memory, pixbufs want RGB
+        frame = np.frombuffer(self._frame, dtype=np.uint8).reshape(self.height, self.width, 4)
+        rgb = np.ascontiguousarray(frame[:, :, 2::-1])
+        pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(rgb.tobytes()), GdkPixbuf.Colorspace.RGB, False, 8,
+                                                 self.width, self.height, self.width * 3)
+
+        path = get_thumbnail_path(self.narrations_folder, time_ms)
+        tmp_path = get_temporary_path(path)
+        pixbuf.savev(tmp_path, 'jpeg', ['quality'], ['80'])
+        os.replace(tmp_path, path)
+        self.extracted += 1
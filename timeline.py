@@ -0,0 +1,266 @@
+import bisect
+import logging
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, Gdk, GObject
+
+LOG = logging.getLogger('epic_narrator.timeline')
+
+
+class Timeline(Gtk.DrawingArea):
+    """Video slider drawn with Cairo, with a tick per narration or the density when they overlap"""
+
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST)
+    def drag_started(self):
+        pass
+
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(int,))
+    def position_selected(self, time_ms):
+        pass
+
+    @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST, arg_types=(int,))
+    def drag_finished(self, time_ms):
+        pass
+
+    def __init__(self, tick_colour='#ff3300', height=30, handle_radius=7, max_zoom_ms=10000):
+        Gtk.DrawingArea.__init__(self)
+        self.length_ms = 0
+        self.position_ms = 0
+        self.view_start_ms = 0
+        self.view_end_ms = 0
+        self.max_zoom_ms = max_zoom_ms  # the narrowest view
+        self.ticks = []  # sorted
+        self.density = None
+        self.height = height
+        self.handle_radius = handle_radius
+        self.margin = handle_radius + 1
+        self.tick_colour = Gdk.RGBA()
+        self.tick_colour.parse(tick_colour)
+        self.track_colour = (0.75, 0.75, 0.75)
+        self.played_colour = (0.35, 0.35, 0.35)
+        self.handle_colour = (0.15, 0.15, 0.15)
+        self.dragging = False
+
+        self.set_size_request(-1, self.height)
+        self.set_hexpand(True)
+        self.set_valign(Gtk.Align.CENTER)
+        self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK | Gdk.EventMask.BUTTON_RELEASE_MASK |
+                        Gdk.EventMask.POINTER_MOTION_MASK | Gdk.EventMask.SCROLL_MASK)
+        self.connect('draw', self.draw)
+        self.connect('button-press-event', self.pressed)
+        self.connect('motion-notify-event', self.moved)
+        self.connect('button-release-event', self.released)
+        self.connect('scroll-event', self.scrolled)
+
+    def get_track_width(self):
+        return max(1, self.get_allocated_width() - 2 * self.margin)
+
+    def get_view_length(self):
+        return max(1, self.view_end_ms - self.view_start_ms)
+
+    def time_to_x(self, time_ms):
+        if self.length_ms <= 0:
+            return self.margin
+
+        return self.margin + (time_ms - self.view_start_ms) * self.get_track_width() / self.get_view_length()
+
+    def x_to_time(self, x):
+        if self.length_ms <= 0:
+            return 0
+
+        return self.view_start_ms + (x - self.margin) * self.get_view_length() / self.get_track_width()
+
+    def is_zoomed(self):
+        return self.view_end_ms - self.view_start_ms < self.length_ms
+
+    def set_view(self, start_ms, end_ms):
+        view_length = min(self.length_ms, max(self.max_zoom_ms, end_ms - start_ms))
+        start_ms = min(max(0, start_ms), self.length_ms - view_length)
+        self.view_start_ms, self.view_end_ms = start_ms, start_ms + view_length
+        self.queue_draw()
+
+    def zoom(self, factor, anchor_x):
+        anchor_ms = self.x_to_time(anchor_x)
+        view_length = self.get_view_length() * factor
+        anchor_fraction = (anchor_ms - self.view_start_ms) / self.get_view_length()
+        self.set_view(anchor_ms - anchor_fraction * view_length, anchor_ms + (1 - anchor_fraction) * view_length)
+
+    def get_position_key(self, time_ms):
+        """The pixel of the playhead, positions with the same key are drawn the same"""
+        return int(self.time_to_x(time_ms))
+
+    def set_length(self, length_ms):
+        self.length_ms = length_ms
+        self.position_ms = min(self.position_ms, length_ms)
+        self.set_view(0, length_ms)
+
+    def set_density(self, density):
+        self.density = density
+        self.queue_draw()
+
+    def set_position(self, time_ms):
+        # a zoomed view follows the playhead when it leaves it
+        if not self.dragging and self.is_zoomed() and not self.view_start_ms <= time_ms <= self.view_end_ms:
+            self.position_ms = time_ms
+            self.set_view(time_ms - self.get_view_length() / 10, time_ms + 9 * self.get_view_length() / 10)
+            return
+
+        old_x = self.time_to_x(self.position_ms)
+        self.position_ms = time_ms
+        new_x = self.time_to_x(time_ms)
+
+        # the played part of the track between the two positions changes too
+        left = int(min(old_x, new_x)) - self.handle_radius - 1
+        right = int(max(old_x, new_x)) + self.handle_radius + 2
+        self.queue_draw_area(left, 0, right - left, self.get_allocated_height())
+
+    def is_showing_density(self):
+        first = bisect.bisect_left(self.ticks, self.view_start_ms)
+        last = bisect.bisect_right(self.ticks, self.view_end_ms)
+
+        return self.density is not None and last - first > self.get_track_width() / 4
+
+    def _queue_draw_tick(self, time_ms):
+        if self.is_showing_density():
+            self.queue_draw()  # the bars are scaled to the densest column, any of them can change
+            return
+
+        x = int(self.time_to_x(time_ms))
+        self.queue_draw_area(x - 2, 0, 4, self.get_allocated_height())
+
+    def add_tick(self, time_ms):
+        idx = bisect.bisect_left(self.ticks, time_ms)
+
+        if idx < len(self.ticks) and self.ticks[idx] == time_ms:
+            return
+
+        self.ticks.insert(idx, time_ms)
+        self._queue_draw_tick(time_ms)
+
+    def remove_tick(self, time_ms):
+        idx = bisect.bisect_left(self.ticks, time_ms)
+
+        if idx < len(self.ticks) and self.ticks[idx] == time_ms:
+            del self.ticks[idx]
+            self._queue_draw_tick(time_ms)
+
+    def set_ticks(self, times_ms):
+        self.ticks = sorted(set(times_ms))
+        self.queue_draw()
+
+    def clear_ticks(self):
+        self.ticks = []
+        self.queue_draw()
+
+    def draw(self, widget, cr):
+        height = self.get_allocated_height()
+        track_y = height * 2 / 3
+        x1, _, x2, _ = cr.clip_extents()
+
+        # track, with the played part darker
+        position_x = self.time_to_x(self.position_ms)
+        played_x = min(max(self.margin, position_x), self.margin + self.get_track_width())
+        cr.set_line_width(4)
+        cr.set_source_rgb(*self.played_colour)
+        cr.move_to(self.margin, track_y)
+        cr.line_to(played_x, track_y)
+        cr.stroke()
+        cr.set_source_rgb(*self.track_colour)
+        cr.move_to(played_x, track_y)
+        cr.line_to(self.margin + self.get_track_width(), track_y)
+        cr.stroke()
+
+        # ticks in the damaged region only, at most one per pixel column
+        if self.is_showing_density():
+            self.draw_density(cr, track_y - 3)
+        elif self.ticks and self.length_ms > 0:
+            first = bisect.bisect_left(self.ticks, self.x_to_time(x1 - 1))
+            last = bisect.bisect_right(self.ticks, self.x_to_time(x2 + 1))
+            last_column = None
+            Gdk.cairo_set_source_rgba(cr, self.tick_colour)
+            cr.set_line_width(2)
+
+            for time_ms in self.ticks[first:last]:
+                column = int(self.time_to_x(time_ms))
+
+                if column == last_column:
+                    continue
+
+                last_column = column
+                cr.move_to(column + 0.5, 2)
+                cr.line_to(column + 0.5, track_y - 3)
+
+            cr.stroke()
+
+        # playhead
+        cr.set_source_rgb(*self.handle_colour)
+        cr.arc(position_x, track_y, self.handle_radius, 0, 6.2832)
+        cr.fill()
+
+        return False
+
+    def draw_density(self, cr, bottom, column_px=2):
+        # bars of narrations per column, read from the density pyramid at the resolution of the view
+        track_width = self.get_track_width()
+        n_columns = max(1, int(track_width // column_px))
+        counts = self.density.get_counts(self.view_start_ms, self.view_end_ms, n_columns)
+        max_count = counts.max()
+
+        if max_count <= 0:
+            return
+
+        column_width = track_width / n_columns
+        Gdk.cairo_set_source_rgba(cr, self.tick_colour)
+
+        for column in counts.nonzero()[0]:
+            bar_height = max(1, (bottom - 2) * counts[column] / max_count)
+            cr.rectangle(self.margin + column * column_width, bottom - bar_height, column_width, bar_height)
+
+        cr.fill()
+
+    def _get_time(self, x):
+        return int(min(max(1, self.x_to_time(x)), max(1, self.length_ms)))
+
+    def scrolled(self, widget, event):
+        if self.length_ms <= 0:
+            return False
+
+        if event.direction == Gdk.ScrollDirection.SMOOTH:
+            _, _, delta = event.get_scroll_deltas()
+        else:
+            delta = -1 if event.direction in [Gdk.ScrollDirection.UP, Gdk.ScrollDirection.LEFT] else 1
+
+        if delta == 0:
+            return False
+
+        if event.state & Gdk.ModifierType.CONTROL_MASK:
+            self.zoom(2 if delta > 0 else 0.5, event.x)
+        elif self.is_zoomed():
+            shift = self.get_view_length() / 10 * (1 if delta > 0 else -1)
+            self.set_view(self.view_start_ms + shift, self.view_end_ms + shift)
+
+        return True
+
+    def pressed(self, widget, event):
+        if event.button != 1 or self.length_ms <= 0:
+            return False
+
+        self.dragging = True
+        self.emit('drag_started')
+        self.emit('position_selected', self._get_time(event.x))
+        return True
+
+    def moved(self, widget, event):
+        if self.dragging:
+            self.emit('position_selected', self._get_time(event.x))
+
+        return self.dragging
+
+    def released(self, widget, event):
+        if not self.dragging:
+            return False
+
+        self.dragging = False
+        self.emit('drag_finished', self._get_time(event.x))
+        return True
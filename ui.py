@@ -1,20 +1,17 @@
+import bisect
+import importlib
 import logging
 import os
-import queue
-import matplotlib as mpl
 
 from __version__ import __version__, __author__
 
-mpl.use('PS')
-import matplotlib.pyplot as plt
 import gi
-import numpy as np
 
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GLib, Gdk, Pango, GObject, GdkPixbuf
-from matplotlib.animation import FuncAnimation
-from matplotlib.backends.backend_gtk3agg import (FigureCanvasGTK3Agg as FigureCanvas)
+from frame_scheduler import FrameScheduler
 from recordings import ms_to_timestamp
+from timeline import Timeline
 
 
 LOG = logging.getLogger('epic_narrator.ui')
@@ -27,11 +24,6 @@ class MainWindow(Gtk.ApplicationWindow):
         gtk_settings = Gtk.Settings.get_default()
         gtk_settings.set_property("gtk-application-prefer-dark-theme", False)
 
-        if this_os == 'mac_os':
-            plt.switch_backend('MacOSX')
-        else:
-            plt.switch_backend('GTK3Agg')
-
         icon_path = get_icon_path()
 
         if icon_path is not None:
@@ -40,6 +32,9 @@ class MainWindow(Gtk.ApplicationWindow):
         self.controller = controller
         self.ready = False
 
+        # time label and slider are updated once per frame, however often the video position changes
+        self.frame_scheduler = FrameScheduler(self, 'Main window')
+
         # generic properties
         self.red_tick_colour = "#ff3300"
         self.single_window = single_window
@@ -63,8 +58,10 @@ class MainWindow(Gtk.ApplicationWindow):
         self.speed_time_box.pack_end(self.play_recs_with_video_button, False, False, 5)
 
         # slider
-        self.slider = Gtk.Scale(orientation=Gtk.Orientation.HORIZONTAL, adjustment=None)
-        self.set_slider()
+        self.slider = Timeline(tick_colour=self.red_tick_colour)
+
+        self.frame_scheduler.register('time_label', self.update_time_label, key_function=ms_to_timestamp)
+        self.frame_scheduler.register('slider', self.slider.set_position, key_function=self.slider.get_position_key)
 
         # boxes and packing
         self.left_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -76,7 +73,8 @@ class MainWindow(Gtk.ApplicationWindow):
         # microphone monitor
         self.monitor_label = Gtk.Label()
         self.set_monitor_label(None, 'not_recording')
-        self.mic_monitor = MicMonitor(self.controller)
+        self.mic_monitor = create_mic_monitor(self.controller,
+                                              self.controller.get_setting('mic_monitor', 'level_meter'))
 
         # path labels
         self.video_path_label = Gtk.Label(label=' ')
@@ -103,19 +101,20 @@ class MainWindow(Gtk.ApplicationWindow):
         self.add(self.main_box)
 
     def add_slider_tick(self, sender, time_ms, rec_idx, new):
-        self.slider.add_mark(time_ms, Gtk.PositionType.TOP, None)
+        self.slider.add_tick(time_ms)
 
-    def slider_moved(self, *args):
-        slider_pos_ms = self.slider.get_value()
+    def load_slider_ticks(self, sender, times_ms):
+        self.slider.set_ticks(times_ms)
+
+    def slider_moved(self, sender, slider_pos_ms):
         self.controller.go_to(slider_pos_ms)
 
     def slider_clicked(self, *args):
         LOG.info("Slider clicked")
         self.controller.start_dragging()
 
-    def slider_released(self, *args):
+    def slider_released(self, sender, slider_pos_ms):
         LOG.info("Slider released")
-        slider_pos_ms = int(self.slider.get_value())
         self.controller.stop_dragging(slider_pos_ms)
 
     def get_monitor_size(self):
@@ -207,26 +206,30 @@ class MainWindow(Gtk.ApplicationWindow):
         self.connect('show', self.showing)
         self.connect("key-press-event", self.controller.main_window_key_pressed)
         self.connect("key-release-event", self.controller.main_window_key_released)
-        self.slider.connect('change-value', self.slider_moved)
-        self.slider.connect('button-press-event', self.slider_clicked)
-        self.slider.connect('button-release-event', self.slider_released)
+        self.slider.connect('position_selected', self.slider_moved)
+        self.slider.connect('drag_started', self.slider_clicked)
+        self.slider.connect('drag_finished', self.slider_released)
         self.controller.signal_sender.connect('video_loaded', self.video_loaded)
         self.controller.signal_sender.connect('ask_video_path', self.choose_video)
         self.controller.signal_sender.connect('ask_output_path', self.choose_output_folder)
+        self.controller.signal_sender.connect('ask_playlist_paths', self.choose_playlist)
         self.controller.signal_sender.connect('video_moving', self.video_moving)
         self.controller.signal_sender.connect('video_jumped', self.video_jumped)
         self.controller.signal_sender.connect('recording_added', self.add_slider_tick)
+        self.controller.signal_sender.connect('recordings_loaded', self.load_slider_ticks)
         self.controller.signal_sender.connect('recording_state_changed', self.set_monitor_label)
+        self.controller.signal_sender.connect('mic_monitor_changed', self.change_mic_monitor)
         self.controller.signal_sender.connect('recording_deleted', self.refresh_recording_ticks)
         self.controller.signal_sender.connect('resetting_recordings', self.remove_recording_ticks)
+        self.controller.signal_sender.connect('narration_density_changed', self.set_slider_density)
         self.controller.signal_sender.connect('output_path_changed', self.update_output_path_label)
         self.controller.signal_sender.connect('ask_confirmation_for_deleting_rec', self.ask_confirmation_for_deleting)
         self.controller.signal_sender.connect('ask_confirmation_for_overwriting_rec',
                                               self.ask_confirmation_for_overwriting)
 
     def update_time_position(self, current_time_ms):
-        self.slider.set_value(current_time_ms)
-        self.update_time_label(current_time_ms)
+        self.frame_scheduler.mark_dirty('slider', current_time_ms)
+        self.frame_scheduler.mark_dirty('time_label', current_time_ms)
 
     def video_moving(self, sender, current_time_ms, is_seeking):
         self.update_time_position(current_time_ms)
@@ -288,6 +291,29 @@ class MainWindow(Gtk.ApplicationWindow):
         else:
             file_dialog.destroy()
 
+    def choose_playlist(self, sender, saved_video_folder):
+        LOG.info('Opening file chooser dialog for playlist (saved folder={})'.format(saved_video_folder))
+
+        file_dialog = Gtk.FileChooserDialog(title="Open videos", parent=self, action=Gtk.FileChooserAction.OPEN)
+        file_dialog.set_select_multiple(True)
+        file_dialog.add_button("Cancel", Gtk.ResponseType.CANCEL)
+        file_dialog.add_button("OK", Gtk.ResponseType.OK)
+
+        video_file_filter = Gtk.FileFilter()
+        video_file_filter.set_name("Video files")
+        video_file_filter.add_mime_type("video/*")
+        file_dialog.add_filter(video_file_filter)
+
+        if saved_video_folder:
+            file_dialog.set_current_folder(saved_video_folder)
+
+        response = file_dialog.run()
+        paths = file_dialog.get_filenames()
+        file_dialog.destroy()
+
+        if response == Gtk.ResponseType.OK and paths:
+            self.controller.playlist_selected(sorted(paths))
+
     def choose_output_folder(self, sender, suggested_folder, changing_output):
         LOG.info('Opening file chooser dialog for output '
                  '(suggested folder={}, changing output={})'.format(suggested_folder, changing_output))
@@ -320,8 +346,11 @@ class MainWindow(Gtk.ApplicationWindow):
         self.controller.output_path_selected(path, changing_output)
 
     def video_loaded(self, controller, video_length, video_path, output_path):
-        self.slider.set_range(1, video_length)
-        self.update_time_label(0)
+        self.slider.set_length(video_length)
+        self.slider.set_density(self.controller.get_narration_density())
+        self.frame_scheduler.invalidate('slider')
+        self.frame_scheduler.invalidate('time_label')  # the length of the video is part of the label
+        self.frame_scheduler.run_now('time_label', 0)
         self.set_video_recordings_paths_labels(video_path, output_path)
 
     def set_video_recordings_paths_labels(self, video_path, output_path):
@@ -342,6 +371,8 @@ class MainWindow(Gtk.ApplicationWindow):
             self.video_area.area.destroy()
             self.narrations_window.destroy()
 
+        self.frame_scheduler.log_stats()
+        self.narrations_box.frame_scheduler.log_stats()
         self.menu_bar.closing()
         self.controller.shutting_down()
 
@@ -366,24 +397,28 @@ class MainWindow(Gtk.ApplicationWindow):
         time_txt = ' {} / {} '.format(ms_str, total_length_str)
         self.time_label.set_markup('<span bgcolor="black" fgcolor="white"><tt>{}</tt></span>'.format(time_txt))
 
-    def set_slider(self):
-        self.slider.set_hexpand(True)
-        self.slider.set_valign(Gtk.Align.CENTER)
-        self.slider.set_draw_value(False)
-
     def refresh_recording_ticks(self, sender, time_ms):
-        self.slider.clear_marks()  # unfortunately there is no way to remove only one tick :(
-
-        for time_ms in self.controller.get_recording_times():
-            self.add_slider_tick(None, time_ms, None, False)
+        self.slider.remove_tick(time_ms)
 
     def remove_recording_ticks(self, *args):
-        self.slider.clear_marks()
+        self.slider.clear_ticks()
+
+    def set_slider_density(self, sender, density):
+        self.slider.set_density(density)
 
     def set_monitor_label(self, sender, recording_state):
         colour = '#ff3300' if recording_state == 'recording' else 'black'
         self.monitor_label.set_markup('<span foreground="{}">Microphone level</span>'.format(colour))
 
+    def change_mic_monitor(self, sender, kind):
+        position = self.left_box.child_get_property(self.mic_monitor, 'position')
+        self.mic_monitor.stop()
+        self.left_box.remove(self.mic_monitor)
+        self.mic_monitor = create_mic_monitor(self.controller, kind)
+        self.left_box.pack_start(self.mic_monitor, False, False, 10)
+        self.left_box.reorder_child(self.mic_monitor, position)
+        self.mic_monitor.show()
+
     def set_path_labels(self):
         for path_labels in [self.video_path_label, self.recordings_path_label]:
             path_labels.set_property('lines', 1)
@@ -443,11 +478,22 @@ class Menu(Gtk.MenuBar):
         self.file_menu = Gtk.Menu()
         self.load_video_menu_item = Gtk.MenuItem(label='Load video')
         self.load_video_menu_item.connect('button-press-event', self.controller.load_video_menu_pressed)
+        self.load_playlist_menu_item = Gtk.MenuItem(label='Load playlist')
+        self.load_playlist_menu_item.connect('button-press-event', self.controller.load_playlist_menu_pressed)
+        self.next_video_menu_item = Gtk.MenuItem(label='Next video in playlist')
+        self.next_video_menu_item.connect('button-press-event', self.controller.next_video)
         self.change_output_menu_item = Gtk.MenuItem(label='Change output folder')
         self.change_output_menu_item.connect('button-press-event', self.controller.change_output_menu_pressed)
 
+        self.review_menu_item = Gtk.CheckMenuItem(label='Review all recordings')
+        self.review_toggled_handler = self.review_menu_item.connect('toggled', self.controller.toggle_review)
+        self.controller.signal_sender.connect('review_state_changed', self.review_state_changed)
+
         self.file_menu.append(self.load_video_menu_item)
+        self.file_menu.append(self.load_playlist_menu_item)
+        self.file_menu.append(self.next_video_menu_item)
         self.file_menu.append(self.change_output_menu_item)
+        self.file_menu.append(self.review_menu_item)
         self.file_menu_item = Gtk.MenuItem(label='File')
         self.file_menu_item.set_submenu(self.file_menu)
 
@@ -465,8 +511,46 @@ class Menu(Gtk.MenuBar):
         self.play_after_delete_menu_item.set_active(controller.get_setting('play_after_delete', False))
         self.play_after_delete_menu_item.connect('toggled', self.controller.play_after_delete_toggled)
 
+        self.low_latency_playback_menu_item = Gtk.CheckMenuItem(label='Low latency recording playback')
+        self.low_latency_playback_menu_item.set_active(controller.get_setting('low_latency_rec_playback', False))
+        self.low_latency_playback_menu_item.connect('toggled', self.controller.low_latency_rec_playback_toggled)
+
+        self.seek_proxy_menu_item = Gtk.CheckMenuItem(label='Use low resolution copy for seeking')
+        self.seek_proxy_menu_item.set_active(controller.get_setting('use_seek_proxy', False))
+        self.seek_proxy_menu_item.connect('toggled', self.controller.use_seek_proxy_toggled)
+
+        self.min_gap_menu = Gtk.Menu()
+        self.min_gap_menu_item = Gtk.MenuItem(label='Minimum gap length')
+        self.min_gap_menu_item.set_submenu(self.min_gap_menu)
+        min_gap_seconds = controller.get_setting('min_gap_seconds', 10)
+        group = None
+
+        for seconds in [5, 10, 30, 60]:
+            gap_menu_item = Gtk.RadioMenuItem(label='{} seconds'.format(seconds), group=group)
+            group = gap_menu_item
+            gap_menu_item.set_active(seconds == min_gap_seconds)
+            gap_menu_item.connect('toggled', self.controller.min_gap_selected, seconds)
+            self.min_gap_menu.append(gap_menu_item)
+
+        self.mic_monitor_menu = Gtk.Menu()
+        self.mic_monitor_menu_item = Gtk.MenuItem(label='Microphone monitor')
+        self.mic_monitor_menu_item.set_submenu(self.mic_monitor_menu)
+        mic_monitor = controller.get_setting('mic_monitor', 'level_meter')
+        group = None
+
+        for kind, label in [('level_meter', 'Level meter (lightweight)'), ('plot', 'Plot')]:
+            monitor_menu_item = Gtk.RadioMenuItem(label=label, group=group)
+            group = monitor_menu_item
+            monitor_menu_item.set_active(kind == mic_monitor)
+            monitor_menu_item.connect('toggled', self.controller.mic_monitor_selected, kind)
+            self.mic_monitor_menu.append(monitor_menu_item)
+
         self.settings_menu.append(self.hold_to_record_menu_item)
         self.settings_menu.append(self.play_after_delete_menu_item)
+        self.settings_menu.append(self.low_latency_playback_menu_item)
+        self.settings_menu.append(self.seek_proxy_menu_item)
+        self.settings_menu.append(self.min_gap_menu_item)
+        self.settings_menu.append(self.mic_monitor_menu_item)
         self.settings_menu_item = Gtk.MenuItem(label='Settings')
         self.settings_menu_item.set_submenu(self.settings_menu)
 
@@ -490,6 +574,11 @@ class Menu(Gtk.MenuBar):
     def closing(self):
         self.help_window.destroy()
 
+    def review_state_changed(self, sender, state):
+        # update the check box without triggering the controller again
+        with self.review_menu_item.handler_block(self.review_toggled_handler):
+            self.review_menu_item.set_active(state == 'reviewing')
+
     def show_help(self, *args):
         self.help_window.show_all()
 
@@ -568,7 +657,17 @@ class VideoArea:
         cairo_ctx.paint()
 
     def ready(self, widget):
+        # the video player (and libvlc) is set up once the window is drawn, so the window shows up sooner
+        self._first_draw_id = widget.connect_after('draw', self.first_drawn)
+
+    def first_drawn(self, widget, cairo_ctx):
+        widget.disconnect(self._first_draw_id)
+        GLib.idle_add(self.start_player, widget)
+        return False
+
+    def start_player(self, widget):
         self.controller.ui_video_area_ready(widget)
+        return False
 
 
 class PlaybackBox(Gtk.ButtonBox):
@@ -645,191 +744,308 @@ class PlaybackBox(Gtk.ButtonBox):
             LOG.error('Got unrecognised recording state signal {}'.format(state))
 
 
-class MicMonitor(FigureCanvas):
-    def __init__(self, controller, plot_interval_ms=30):
-        # microphone monitor
+class RecordingWaveform(Gtk.DrawingArea):
+    """Waveform of a recording drawn from its peaks, never from the audio"""
+
+    def __init__(self, controller, width=60, height=20):
+        Gtk.DrawingArea.__init__(self)
         self.controller = controller
-        self.fig, self.ax, self.lines, self.data = self.prepare_monitor_fig()
-        FigureCanvas.__init__(self, self.fig)  # a Gtk.DrawingArea
-        self.set_size_request(100, 50)
-        self.monitor_animation = FuncAnimation(self.fig, self.update_mic_monitor, interval=plot_interval_ms, blit=True)
-        self.is_recording = False
-        self.controller.signal_sender.connect('recording_state_changed', self.change_recording_state)
-
-    def prepare_monitor_fig(self):
-        plt.style.use('dark_background')
-        mpl.rcParams['toolbar'] = 'None'
-        fig, ax = plt.subplots()
-
-        window_length, n_channels = self.controller.get_recorder_window_size()
-        data = np.zeros((window_length, n_channels))
-        lines = ax.plot(data, color='w')
-        ax.axis((0, len(data), -0.25, 0.25))
-        ax.set_yticks([0])
-        ax.yaxis.grid(True)
-        fig.tight_layout(pad=-5)
-        ax.axis('off')
-        fig.canvas.set_window_title('Epic Narrator Monitor')
-
-        return fig, ax, lines, data
-
-    def update_mic_monitor(self, *args):
-        while True:
-            try:
-                data = self.controller.get_recorder_data()
-            except queue.Empty:
-                break
-
-            shift = len(data)
-            self.data = np.roll(self.data, -shift, axis=0)
-            self.data[-shift:, :] = data
-
-        for column, line in enumerate(self.lines):
-            line.set_ydata(self.data[:, column])
-            color = 'red' if self.is_recording else 'white'
-            line.set_color(color)
-
-        return self.lines
-
-    def change_recording_state(self, sender, state):
-        self.is_recording = state == 'recording'
-
-
-class NarrationsBox(Gtk.ListBox):
-    def __init__(self, controller, main_window):
-        Gtk.ListBox.__init__(self)
-        self.set_selection_mode(Gtk.SelectionMode.NONE)
+        self.time_ms = None
+        self.peaks = None
+        self.set_size_request(width, height)
+        self.set_valign(Gtk.Align.CENTER)
+        self.connect('draw', self.draw)
+
+    def set_recording(self, time_ms):
+        self.time_ms = time_ms
+        self.peaks = None
+        self.queue_draw()
+
+    def draw(self, widget, cr):
+        if self.peaks is None and self.time_ms is not None:
+            self.peaks = self.controller.get_recording_peaks(self.time_ms)
+
+        if self.peaks is None:
+            return False
+
+        width = self.get_allocated_width()
+        middle = self.get_allocated_height() / 2
+        mins, maxs = self.peaks.get_peaks(width)
+        cr.set_source_rgb(0.35, 0.35, 0.35)
+        cr.set_line_width(1)
+
+        for x, (low, high) in enumerate(zip(mins, maxs)):
+            cr.move_to(x + 0.5, middle - high * middle)
+            cr.line_to(x + 0.5, middle - low * middle + 1)
+
+        cr.stroke()
+        return False
+
+
+class NarrationRow(Gtk.ButtonBox):
+    """The widgets of one narration in the recordings panel. Rows are recycled: bind() shows another narration"""
+
+    def __init__(self, narrations_box):
+        Gtk.ButtonBox.__init__(self)
+        self.time_ms = None
+        self.time_label = Gtk.Label()
+        self.time_button = Gtk.Button()
+        self.time_button.add(self.time_label)
+
+        # we need to create new images every time otherwise only the last entry will display the image
+        self.play_button = Gtk.Button()
+        self.play_button.set_image(Gtk.Image.new_from_icon_name('media-playback-start', Gtk.IconSize.BUTTON))
+        self.delete_button = Gtk.Button()
+        self.delete_button.set_image(Gtk.Image.new_from_icon_name('user-trash', Gtk.IconSize.BUTTON))
+        self.waveform = RecordingWaveform(narrations_box.controller)
+
+        self.time_button.connect('button-press-event', narrations_box.recording_timestamp_pressed)
+        self.time_button.set_has_tooltip(True)
+        self.time_button.connect('query-tooltip', narrations_box.show_thumbnail)
+        self.play_button.connect('button-press-event', narrations_box.play_recording_pressed)
+        self.delete_button.connect('button-press-event', narrations_box.delete_recording_pressed)
+
+        self.pack_start(self.time_button, False, False, 0)
+        self.pack_start(self.waveform, False, False, 0)
+        self.pack_start(self.play_button, False, False, 0)
+        self.pack_start(self.delete_button, False, False, 0)
+        self.set_layout(Gtk.ButtonBoxStyle.CENTER)
+        self.set_spacing(5)
+
+        # preventing the buttons to be activated with the keyboard
+        for b in [self.time_button, self.play_button, self.delete_button]:
+            b.connect('key-press-event', do_nothing_on_key_press)
+            b.connect('key-release-event', do_nothing_on_key_press)
+
+    def bind(self, time_ms, highlight_class):
+        if time_ms != self.time_ms:
+            self.time_ms = time_ms
+            self.waveform.set_recording(time_ms)
+            self.time_label.set_markup('<span foreground="black"><tt>{}</tt></span>'.format(
+                ms_to_timestamp(time_ms)))
+
+        self.set_highlight(highlight_class)
+
+    def set_highlight(self, highlight_class):
+        context = self.time_button.get_style_context()
+
+        for c in ['destructive-action', 'suggested-action']:
+            if c != highlight_class:
+                context.remove_class(c)
+
+        if highlight_class is not None:
+            context.add_class(highlight_class)
+
+
+class NarrationsBox(Gtk.Layout):
+    """Recordings panel with widgets only for the visible rows, recycled as it scrolls"""
+
+    def __init__(self, controller, main_window, default_row_height=40):
+        Gtk.Layout.__init__(self)
 
         # removing background
         provider = Gtk.CssProvider()
-        provider.load_from_data(b".list {background-color: transparent}")
+        provider.load_from_data(b".narrations {background-color: transparent}")
         context = self.get_style_context()
-        context.add_class('list')
+        context.add_class('narrations')
         context.add_provider(provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
 
         self.controller = controller
         self.main_window = main_window
-        self.narrations_map = {}
-        self.highlighted_recording_button = None
-
+        self.narration_times = []  # sorted
+        self.highlighted = None  # (time_ms, current_recording)
+        self.row_height = default_row_height
+        self.row_height_measured = False
+        self.row_pool = []
+        self.visible_rows = {}  # time_ms -> row
+        self.width = 0
+        self._updating_rows = False
+
+        # the highlighted recording can change many times per frame while seeking, we only draw the last one
+        self.frame_scheduler = FrameScheduler(self, 'Recordings panel')
+        self.frame_scheduler.register('highlight', self.draw_highlight)
+
+        self.connect('size-allocate', self.resized)
+        self.connect('notify::vadjustment', self.vadjustment_set)
+        self.vadjustment_set()
         self.controller.signal_sender.connect('recording_added', self.add_narration)
-        self.controller.signal_sender.connect('reset_highlighted_rec', self.reset_highlighted)
-        self.controller.signal_sender.connect('set_highlighted_rec', self.highlight_recording)
+        self.controller.signal_sender.connect('recordings_loaded', self.load_narrations)
+        self.controller.signal_sender.connect('reset_highlighted_rec', self.highlighted_recording_reset)
+        self.controller.signal_sender.connect('set_highlighted_rec', self.highlighted_recording_changed)
         self.controller.signal_sender.connect('recording_deleted', self.remove_annotation_box)
         self.controller.signal_sender.connect('resetting_recordings', self.reset)
 
+    def vadjustment_set(self, *args):
+        adjustment = self.get_vadjustment()
+
+        if adjustment is not None:
+            # scrolling and resizing the panel change which rows are visible
+            adjustment.connect('value-changed', self.update_visible_rows)
+            adjustment.connect('changed', self.update_visible_rows)
+
     def add_narration(self, sender, time_ms, rec_idx, new):
-        box = Gtk.ButtonBox()
+        idx = bisect.bisect_left(self.narration_times, time_ms)
 
-        time_button = Gtk.Button()
-        time_label = Gtk.Label()
-        time_label.set_markup('<span foreground="black"><tt>{}</tt></span>'.format(ms_to_timestamp(time_ms)))
-        time_button.add(time_label)
+        if idx < len(self.narration_times) and self.narration_times[idx] == time_ms:
+            return
 
-        play_button = Gtk.Button()
+        self.narration_times.insert(idx, time_ms)
+        self.update_visible_rows()
 
-        # we need to create new images every time otherwise only the last entry will display the image
-        play_button.set_image(Gtk.Image.new_from_icon_name('media-playback-start', Gtk.IconSize.BUTTON))
-        delete_button = Gtk.Button()
-        delete_button.set_image(Gtk.Image.new_from_icon_name('user-trash', Gtk.IconSize.BUTTON))
-
-        time_button.connect('button-press-event', self.recording_timestamp_pressed, time_ms)
-        play_button.connect('button-press-event', self.play_recording_pressed, time_ms)
-        delete_button.connect('button-press-event', self.delete_recording_pressed, time_ms)
-        box.connect('size-allocate', self.new_recording_visible, time_ms, new)
-
-        box.pack_start(time_button, False, False, 0)
-        box.pack_start(play_button, False, False, 0)
-        box.pack_start(delete_button, False, False, 0)
-        box.set_layout(Gtk.ButtonBoxStyle.CENTER)
-        box.set_spacing(5)
-        box.show_all()
+        if new:
+            self.frame_scheduler.run_now('highlight', (time_ms, True, True))
 
-        # preventing the buttons to be activated with the keyboard
-        for b in [time_button, play_button, delete_button]:
-            b.connect('key-press-event', do_nothing_on_key_press)
-            b.connect('key-release-event', do_nothing_on_key_press)
+    def load_narrations(self, sender, times_ms):
+        # only the visible rows are built, so even thousands of narrations are shown at once
+        self.narration_times = sorted(set(self.narration_times).union(times_ms))
+        self.update_visible_rows()
 
-        self.narrations_map[time_ms] = box
-        self.insert(box, rec_idx)
+    def remove_annotation_box(self, sender, time_ms):
+        idx = bisect.bisect_left(self.narration_times, time_ms)
 
-        if new:
-            self.highlight_recording(None, time_ms, True, recording_box=box, scroll=False)
+        if idx == len(self.narration_times) or self.narration_times[idx] != time_ms:
+            return
 
-        return box
+        del self.narration_times[idx]
+        self.frame_scheduler.invalidate('highlight')
 
-    def new_recording_visible(self, widget, event, time_ms, new):
-        if new:
-            self.scroll_to_rec(time_ms, box=widget)
+        if self.highlighted is not None and self.highlighted[0] == time_ms:
+            self.highlighted = None
+
+        self.update_visible_rows()
 
     def reset(self, *args):
-        self.remove_all_narrations_boxes()
-        self.reset_highlighted()
-        self.narrations_map = {}
+        self.narration_times = []
+        self.highlighted = None
+        self.frame_scheduler.invalidate('highlight')
+        self.update_visible_rows()
 
-    def remove_annotation_box(self, sender, time_ms):
-        box = self.narrations_map.pop(time_ms, None)
+    def resized(self, widget, allocation):
+        if allocation.width != self.width:
+            self.width = allocation.width
+            self.update_visible_rows()
 
-        if box is None:
-            return
+    def get_highlight_class(self, time_ms):
+        if self.highlighted is None or self.highlighted[0] != time_ms:
+            return None
 
-        # we need to get the parent which is the list row box
-        # widget is a button box, its parent is a list row box
+        return 'destructive-action' if self.highlighted[1] else 'suggested-action'
 
-        for w in box.get_children():
-            w.destroy()
+    def new_row(self):
+        row = NarrationRow(self)
+        row.show_all()
+        self.put(row, 0, 0)
 
-        self.remove(box.get_parent())
+        if not self.row_height_measured:
+            self.row_height = max(self.row_height, row.get_preferred_height()[1] + 6)
+            self.row_height_measured = True
 
-    def remove_all_narrations_boxes(self):
-        for w in self.get_children():
-            w.destroy()
+        return row
 
-    def scroll_to_rec(self, rec_time, box=None):
-        if box is None:
-            box = self.narrations_map[rec_time] if rec_time in self.narrations_map else None
+    def update_visible_rows(self, *args):
+        if self._updating_rows:
+            return  # resizing the layout below changes the adjustment, which calls this again
 
-        if box is not None:
-            adj = self.get_adjustment()
-            unset, y = self.translate_coordinates(box, 0, 0)
-            unset = False if unset < 1 else True
+        self._updating_rows = True
 
-            if not unset:
-                adj.set_value(abs(y))
+        try:
+            self._update_visible_rows()
+        finally:
+            self._updating_rows = False
 
-    def reset_highlighted(self, *args):
-        if self.highlighted_recording_button is not None:
-            css_classes = ['destructive-action', 'suggested-action']
-            context = self.highlighted_recording_button.get_style_context()
+    def _update_visible_rows(self):
+        self.set_size(self.width, len(self.narration_times) * self.row_height)
+        adjustment = self.get_vadjustment()
+        top = adjustment.get_value() if adjustment is not None else 0
+        page = adjustment.get_page_size() if adjustment is not None and adjustment.get_page_size() > 0 else 800
+        first = max(0, int(top // self.row_height))
+        last = min(len(self.narration_times), int((top + page) // self.row_height) + 1)
+        times = self.narration_times[first:last]
+        visible_times = set(times)
 
-            for c in css_classes:
-                context.remove_class(c)
+        # rows that still show a visible narration keep it, the others are recycled
+        rows = {t: r for t, r in self.visible_rows.items() if t in visible_times}
+        free = [r for t, r in self.visible_rows.items() if t not in rows] + self.row_pool
+        self.row_pool = []
 
-        self.highlighted_recording_button = None
+        for idx, time_ms in enumerate(times, start=first):
+            row = rows.get(time_ms)
 
-    def highlight_recording(self, sender, time_ms, current_recording, recording_box=None, scroll=True):
-        self.reset_highlighted()
+            if row is None:
+                row = free.pop() if free else self.new_row()
+                rows[time_ms] = row
 
-        if recording_box is None:
-            recording_box = self.narrations_map[time_ms] if time_ms in self.narrations_map else None
+            row.bind(time_ms, self.get_highlight_class(time_ms))
 
-        if recording_box is None:
-            return  # this should never happen
+            if tuple(row.get_size_request()) != (self.width, self.row_height):
+                row.set_size_request(self.width, self.row_height)
 
-        button = recording_box.get_children()[0]
-        css_class = 'destructive-action' if current_recording else 'suggested-action'
-        context = button.get_style_context()
-        context.add_class(css_class)
-        self.highlighted_recording_button = button
+            row.show()
+            self.move(row, 0, idx * self.row_height)
+
+        for row in free:
+            row.hide()
+            self.row_pool.append(row)
+
+        self.visible_rows = rows
+
+    def scroll_to_rec(self, rec_time):
+        idx = bisect.bisect_left(self.narration_times, rec_time)
+        adjustment = self.get_vadjustment()
+
+        if adjustment is None or idx == len(self.narration_times) or self.narration_times[idx] != rec_time:
+            return
+
+        adjustment.set_value(min(idx * self.row_height, max(0, adjustment.get_upper() - adjustment.get_page_size())))
+
+    def highlighted_recording_reset(self, *args):
+        self.frame_scheduler.mark_dirty('highlight', None)
+
+    def highlighted_recording_changed(self, sender, time_ms, current_recording):
+        self.frame_scheduler.mark_dirty('highlight', (time_ms, current_recording, True))
+
+    def draw_highlight(self, highlight):
+        if highlight is None:
+            self.reset_highlighted()
+        else:
+            time_ms, current_recording, scroll = highlight
+            self.highlight_recording(None, time_ms, current_recording, scroll=scroll)
+
+    def reset_highlighted(self, *args):
+        if self.highlighted is not None and self.highlighted[0] in self.visible_rows:
+            self.visible_rows[self.highlighted[0]].set_highlight(None)
+
+        self.highlighted = None
+
+    def highlight_recording(self, sender, time_ms, current_recording, scroll=True):
+        self.reset_highlighted()
+        self.highlighted = (time_ms, current_recording)
 
         if scroll:
-            self.scroll_to_rec(time_ms, box=recording_box)
+            self.scroll_to_rec(time_ms)  # this binds the rows that become visible
+
+        if time_ms in self.visible_rows:
+            self.visible_rows[time_ms].set_highlight(self.get_highlight_class(time_ms))
+
+    def show_thumbnail(self, widget, x, y, keyboard_mode, tooltip):
+        thumbnail_path = self.controller.get_thumbnail(widget.get_parent().time_ms)
+
+        if thumbnail_path is None:
+            return False
+
+        try:
+            tooltip.set_icon(GdkPixbuf.Pixbuf.new_from_file(thumbnail_path))
+        except GLib.Error:
+            return False
+
+        return True
 
-    def recording_timestamp_pressed(self, widget, event, time_ms):
+    def recording_timestamp_pressed(self, widget, event):
+        time_ms = widget.get_parent().time_ms
         LOG.info('Recording timestamp pressed (time={}ms)'.format(time_ms))
 
         self.controller.go_to(time_ms, jumped=True)
-        self.highlight_recording(None, time_ms, False, recording_box=widget.get_parent(), scroll=False)
+        self.frame_scheduler.run_now('highlight', (time_ms, False, False))
 
         # right click triggers overwriting
         if event.button == 3:
@@ -837,7 +1053,8 @@ class NarrationsBox(Gtk.ListBox):
             self.controller.pause_video()
             self.main_window.ask_confirmation_for_overwriting(None, time_ms)
 
-    def play_recording_pressed(self, widget, event, time_ms):
+    def play_recording_pressed(self, widget, event):
+        time_ms = widget.get_parent().time_ms
         LOG.info('Recording play pressed (time={}ms)'.format(time_ms))
 
         self.controller.play_recording(time_ms)
@@ -845,9 +1062,10 @@ class NarrationsBox(Gtk.ListBox):
         # right click moves to the video
         if event.button == 3:
             self.controller.go_to(time_ms, jumped=True)
-            self.highlight_recording(None, time_ms, False, recording_box=widget.get_parent(), scroll=False)
+            self.frame_scheduler.run_now('highlight', (time_ms, False, False))
 
-    def delete_recording_pressed(self, widget, event, time_ms):
+    def delete_recording_pressed(self, widget, event):
+        time_ms = widget.get_parent().time_ms
         LOG.info('Recording delete pressed (time={}ms)'.format(time_ms))
 
         # we ask from the main window so the dialog is modal wrt to that window
@@ -941,7 +1159,11 @@ class HelpWindow(Gtk.Assistant):
             'You can override a recording by right-clicking on its timestamp on the recording panel.',
             'You will be asked for a confirmation before overwriting the recording.',
             'The recording will start immediately as you confirm. To stop the recording you will have to',
-            'either click the record button or press Enter, even if you are using the hold-to-record mode.'
+            'either click the record button or press Enter, even if you are using the hold-to-record mode.\n',
+            '<b>Reviewing recordings</b>\n',
+            'Select <tt>File -> Review all recordings</tt> or press <tt>r</tt> to listen to all the recordings',
+            'back to back, starting from the current position. The video and the recordings panel will follow',
+            'the recording being played. Select the menu again or press <tt>r</tt> to stop reviewing.'
         ]
 
     def keyboard_shortcuts_text(self):
@@ -952,7 +1174,10 @@ class HelpWindow(Gtk.Assistant):
             '<b><tt>enter</tt></b> : start/stop recording',
             '<b><tt>delete</tt></b> or <b><tt>backspace</tt></b> : delete the highlighted recording',
             '<b><tt>m</tt></b> : mute/unmute video',
-            '<b><tt>o</tt></b> : overwrite highlighted recording'
+            '<b><tt>o</tt></b> : overwrite highlighted recording',
+            '<b><tt>r</tt></b> : start/stop reviewing all recordings',
+            '<b><tt>n</tt></b> : move to the next video of the playlist',
+            '<b><tt>g</tt></b> : jump to the next gap without recordings'
         ]
 
     def etc_text(self):
@@ -975,6 +1200,23 @@ class HelpWindow(Gtk.Assistant):
         ]
 
 
+# module and class of each microphone monitor, imported when used: the plot monitor needs matplotlib
+MIC_MONITORS = {
+    'level_meter': ('level_meter', 'LevelMeter'),
+    'plot': ('plot_monitor', 'MicMonitor'),
+}
+
+
+def create_mic_monitor(controller, kind):
+    if kind not in MIC_MONITORS:
+        LOG.error('Unknown microphone monitor {}, using the level meter'.format(kind))
+        kind = 'level_meter'
+
+    module_name, class_name = MIC_MONITORS[kind]
+
+    return getattr(importlib.import_module(module_name), class_name)(controller)
+
+
 def get_icon_path():
     local = os.path.join("data", "epic.png")
 
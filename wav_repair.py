@@ -0,0 +1,244 @@
+import logging
+import os
+import shutil
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from durable import fsync_directory, get_final_path, is_temporary_path
+from scan_cache import QUARANTINE_FOLDER, ScanCache, find_recordings
+
+LOG = logging.getLogger('epic_narrator.wav_repair')
+
+# A WAV file whose recording was never closed (e.g. the narrator crashed while recording) keeps the placeholder
+# sizes libsndfile writes when opening the file. The PCM samples are there, but readers will consider the file empty
+# or broken. We fix these files by rewriting the RIFF and data chunk sizes from the actual file size.
+_CHUNK_HEADER = struct.Struct('<4sI')
+_MAX_HEADER_CHUNKS = 64
+
+
+def parse_wav_header(path):
+    """Returns (riff_size, block_align, data_size_offset, data_offset, data_size) or raises ValueError"""
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError('not a RIFF/WAVE file')
+
+        riff_size = struct.unpack('<I', riff[4:8])[0]
+        block_align = None
+        pos = 12
+
+        for _ in range(_MAX_HEADER_CHUNKS):
+            f.seek(pos)
+            chunk_header = f.read(_CHUNK_HEADER.size)
+
+            if len(chunk_header) < _CHUNK_HEADER.size:
+                raise ValueError('no data chunk found')
+
+            chunk_id, chunk_size = _CHUNK_HEADER.unpack(chunk_header)
+
+            if chunk_id == b'fmt ':
+                fmt = f.read(16)
+
+                if len(fmt) < 16:
+                    raise ValueError('truncated fmt chunk')
+
+                block_align = struct.unpack('<H', fmt[12:14])[0]
+            elif chunk_id == b'data':
+                if not block_align:
+                    raise ValueError('data chunk found before a valid fmt chunk')
+
+                return riff_size, block_align, pos + 4, pos + _CHUNK_HEADER.size, chunk_size
+
+            pos += _CHUNK_HEADER.size + chunk_size + (chunk_size & 1)
+
+    raise ValueError('too many chunks before the data chunk')
+
+
+def trailing_chunks_fit(path, pos, file_size):
+    """Whether the file after pos is whole chunks (e.g. LIST) rather than PCM data"""
+    with open(path, 'rb') as f:
+        for _ in range(_MAX_HEADER_CHUNKS):
+            if pos == file_size:
+                return True
+
+            f.seek(pos)
+            chunk_header = f.read(_CHUNK_HEADER.size)
+
+            if len(chunk_header) < _CHUNK_HEADER.size:
+                return False
+
+            chunk_id, chunk_size = _CHUNK_HEADER.unpack(chunk_header)
+
+            if not all(0x20 <= b < 0x7f for b in chunk_id) or not chunk_id.strip().isalnum():
+                return False
+
+            pos += _CHUNK_HEADER.size + chunk_size + (chunk_size & 1)
+
+    return False
+
+
+def check_wav(path, repair=False):
+    """Checks the header sizes of a WAV file. status is 'ok', 'truncated', 'repaired' or 'invalid'"""
+    file_size = os.path.getsize(path)
+
+    try:
+        riff_size, block_align, data_size_offset, data_offset, data_size = parse_wav_header(path)
+    except (OSError, ValueError) as e:
+        return {'status': 'invalid', 'reason': str(e)}
+
+    # the data chunk must reach the end of the file (with its pad byte), or be followed by whole chunks (e.g. LIST).
+    # A data size left at the placeholder 0 with PCM bytes after it is not ok, even if the RIFF size was written
+    data_end = data_offset + data_size + (data_size & 1)
+
+    if riff_size + 8 == file_size and data_offset + data_size <= file_size and \
+            (file_size - data_end in [0, -1] or (data_size > 0 and trailing_chunks_fit(path, data_end, file_size))):
+        return {'status': 'ok'}
+
+    available = file_size - data_offset
+    pcm_size = available - available % block_align
+    result = {'status': 'truncated', 'reason': 'header sizes (riff={}, data={}) do not match the file size ({})'
+              .format(riff_size, data_size, file_size), 'pcm_bytes': pcm_size}
+
+    if repair:
+        repair_wav(path, data_size_offset, data_offset, pcm_size)
+        result['status'] = 'repaired'
+
+    return result
+
+
+def repair_wav(path, data_size_offset, data_offset, pcm_size):
+    LOG.info('Repairing {} ({} bytes of PCM data)'.format(path, pcm_size))
+    padding = pcm_size & 1
+
+    with open(path, 'r+b') as f:
+        # drop incomplete frames and anything after the data
+        f.truncate(data_offset + pcm_size)
+
+        if padding:
+            f.seek(0, os.SEEK_END)
+            f.write(b'\x00')
+
+        f.seek(4)
+        f.write(struct.pack('<I', data_offset + pcm_size + padding - 8))
+        f.seek(data_size_offset)
+        f.write(struct.pack('<I', pcm_size))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def recover_unfinished_recording(temporary_path, quarantine_folder):
+    """Repairs an unfinished recording and moves it in place, or to quarantine"""
+    path = get_final_path(temporary_path)
+    result = check_wav(temporary_path, repair=True)
+
+    if result['status'] != 'invalid' and not os.path.exists(path):
+        LOG.info('Recovering unfinished recording {}'.format(path))
+        os.replace(temporary_path, path)
+        fsync_directory(os.path.dirname(path))
+        return {'status': 'recovered', 'path': path, 'reason': result.get('reason', '')}
+
+    reason = result.get('reason', '') if result['status'] == 'invalid' else 'a finished recording exists'
+    destination = os.path.join(quarantine_folder, os.path.basename(path) + '.part')
+    LOG.info('Moving unfinished recording {} to {} ({})'.format(temporary_path, destination, reason))
+    os.makedirs(quarantine_folder, exist_ok=True)
+    shutil.move(temporary_path, destination)
+
+    return {'status': 'quarantined', 'path': destination, 'reason': reason}
+
+
+def recover_unfinished_recordings(folder, quarantine_folder, audio_extension='wav', min_age_s=10):
+    """Recovers the unfinished recordings in folder older than min_age_s"""
+    results = {}
+    suffix = '.{}.part'.format(audio_extension)
+
+    try:
+        entries = [e for e in os.scandir(folder) if e.name.startswith('.') and e.name.endswith(suffix)]
+    except OSError:
+        return results
+
+    for entry in entries:
+        try:
+            if time.time() - entry.stat().st_mtime < min_age_s:
+                continue
+
+            results[entry.path] = recover_unfinished_recording(entry.path, quarantine_folder)
+        except OSError as e:
+            LOG.error('Could not recover {}: {}'.format(entry.path, e))
+
+    return results
+
+
+def get_quarantine_folder(recordings_root, folder):
+    """Where the files of folder, under the recordings root, are quarantined"""
+    quarantine_root = os.path.join(os.path.dirname(os.path.abspath(recordings_root)), QUARANTINE_FOLDER)
+    return os.path.join(quarantine_root, os.path.relpath(folder, recordings_root))
+
+
+def _check_file(args, min_unfinished_age_s=10):
+    path, repair, quarantine_folder = args
+
+    # unfinished recordings are moved when repaired, so they are never cached. Recent ones may still be recording
+    if is_temporary_path(path):
+        try:
+            if repair and time.time() - os.path.getmtime(path) >= min_unfinished_age_s:
+                return path, None, None, recover_unfinished_recording(path, quarantine_folder)
+
+            result = check_wav(path)
+        except OSError as e:
+            return path, None, None, {'status': 'invalid', 'reason': str(e)}
+
+        result['reason'] = 'unfinished recording, {} when checked: {}'.format(result['status'],
+                                                                             result.get('reason', ''))
+        result['status'] = 'unfinished'
+        return path, None, None, result
+
+    try:
+        result = check_wav(path, repair=repair)
+        stat = os.stat(path)
+    except OSError as e:
+        return path, None, None, {'status': 'invalid', 'reason': str(e)}
+
+    return path, stat.st_size, stat.st_mtime_ns, result
+
+
+class WavChecker:
+    def __init__(self, root, processes=None):
+        self.root = os.path.abspath(root)
+        self.processes = processes
+
+    def check(self, repair=False):
+        """Checks (and optionally repairs) the recordings that changed since the last check"""
+        cache = ScanCache(self.root, 'wav_integrity')
+        files = list(find_recordings(self.root, include_unfinished=True))
+        cached, stale = cache.split(files)
+        to_check = [f[0] for f in stale]
+
+        if repair:
+            to_check.extend(path for path, result in cached.items() if result['status'] == 'truncated')
+
+        LOG.info('Found {} recordings under {} ({} to check)'.format(len(files), self.root, len(to_check)))
+        results = {path: result for path, result in cached.items() if result['status'] != 'ok'}
+
+        if to_check:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                checked = list(executor.map(_check_file, [
+                    (p, repair, get_quarantine_folder(self.root, os.path.dirname(p))) for p in to_check],
+                    chunksize=256))
+
+            # repaired files are fine now, we store them with their new size and modification time
+            cache.put_many((path, size, mtime_ns, {'status': 'ok'} if result['status'] == 'repaired' else result)
+                           for path, size, mtime_ns, result in checked if size is not None)
+
+            for path, _, _, result in checked:
+                if result['status'] == 'ok':
+                    results.pop(path, None)
+                else:
+                    results[path] = result
+
+        cache.prune(f[0] for f in files)
+        cache.close()
+        LOG.info('{} recordings under {} are not ok'.format(len(results), self.root))
+
+        return results